@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+#Headless SDL so the suite runs on machines without a display or audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from config import FPS, SIMULATION_HZ
+from game.board import Board
+from game.engine import Engine, VirtualClock
+from game.grid import Grid
+from game.profiler import percentile
+from game.search import best_placement
+from game.tetromino import Tetromino
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+FILLED = (128, 128, 128)
+
+def measure(function, setup=None, repeat=200, number=50):
+    #Time function() in batches of number calls, returns per-call microseconds for each batch
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter_ns()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter_ns() - started) / number / 1000)
+    return summarize(samples)
+
+def measure_each(function, setup, repeat=500):
+    #Time single calls that need fresh state from setup() before every call
+    samples = []
+    for _ in range(repeat):
+        state = setup()
+        started = time.perf_counter_ns()
+        function(state)
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return summarize(samples)
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "unit": "us",
+        "samples": len(samples),
+        "mean": sum(samples) / len(samples),
+        "min": samples[0],
+        "p50": percentile(samples, 0.50),
+        "p90": percentile(samples, 0.90),
+        "p99": percentile(samples, 0.99),
+        "max": samples[-1]
+    }
+
+def stacked_board(board_class, height, seed=1):
+    #Board filled up to height rows with one gap per row and no full lines
+    board = board_class()
+    cells = [[0] * board.cols for _ in range(board.rows)]
+    for offset in range(height):
+        y = board.rows - 1 - offset
+        gap = (offset * 7 + seed) % board.cols
+        cells[y] = [FILLED if x != gap else 0 for x in range(board.cols)]
+    board.set_cells(cells)
+    return board
+
+def bench_is_valid_position(results):
+    for name, height in (("empty", 0), ("mid_stack", 10), ("near_topout", 17)):
+        board = stacked_board(Board, height)
+        tetrominos = [Tetromino(shape_type, rotation, x, y) for shape_type in "IOTSZJL"
+                      for rotation in range(4) for x in (0, 3, 6) for y in (0, 2, 4)]
+        def check(board=board, tetrominos=tetrominos):
+            for tetromino in tetrominos:
+                board.is_valid_position(tetromino, tetromino.x, tetromino.y + 1)
+        result = measure(check, number=10)
+        for key in ("mean", "min", "p50", "p90", "p99", "max"):
+            result[key] /= len(tetrominos)
+        results[f"grid.is_valid_position[{name}]"] = result
+
+def bench_clear_lines(results):
+    for lines in range(1, 5):
+        def setup(lines=lines):
+            grid = stacked_board(Grid, 12)
+            cells = [row[:] for row in grid.cells]
+            for y in range(grid.rows - lines, grid.rows):
+                cells[y] = [FILLED] * grid.cols
+            grid.set_cells(cells)
+            return grid
+        results[f"grid.clear_lines[{lines}]"] = measure_each(lambda grid: grid.clear_lines(), setup)
+
+def bench_rotation(results):
+    board = stacked_board(Board, 8)
+    #Pieces pressed against walls and the stack so rotations need kicks
+    cases = [Tetromino("I", 1, 0, 8), Tetromino("I", 1, 9, 8), Tetromino("T", 1, 0, 10),
+             Tetromino("L", 3, 8, 9), Tetromino("S", 1, 0, 9), Tetromino("J", 1, 8, 10)]
+    def rotate(clockwise):
+        for tetromino in cases:
+            x, y, rotation = tetromino.x, tetromino.y, tetromino.rotation
+            if clockwise:
+                tetromino.rotate_clockwise(board)
+            else:
+                tetromino.rotate_counterclockwise(board)
+            tetromino.x, tetromino.y, tetromino.rotation = x, y, rotation
+    for name, clockwise in (("rotate_clockwise", True), ("rotate_counterclockwise", False)):
+        result = measure(lambda clockwise=clockwise: rotate(clockwise), number=20)
+        for key in ("mean", "min", "p50", "p90", "p99", "max"):
+            result[key] /= len(cases)
+        results[f"tetromino.{name}[kicks]"] = result
+
+def bench_ghost(results):
+    for name, height in (("empty", 0), ("mid_stack", 10)):
+        board = stacked_board(Board, height)
+        tetromino = Tetromino("T", 0, 4, 0)
+        results[f"grid.get_ghost_position[{name}]"] = measure(lambda: board.get_ghost_position(tetromino))
+
+def make_game():
+    #Game instance that never writes high scores or replays while benchmarking. The persistence
+    #worker is stopped and the sound loader allowed to finish, so no background thread runs during timing
+    from game.game import Game
+    game = Game()
+    game.storage.close()
+    game.assets.loader.join()
+    game.start_game()
+    game.recorder.stop()
+    game.engine.high_score = 1 << 62
+    return game
+
+def bench_game(results, game):
+    engine = game.engine
+
+    def setup_fix():
+        engine.start("Marathon", seed=7)
+        game.recorder.stop()
+        engine.board.set_cells(stacked_board(Board, 6).cells)
+        engine.current_tetromino.y = engine.board.get_ghost_position(engine.current_tetromino)[1]
+        return engine
+    results["game.fix_tetromino"] = measure_each(lambda engine: engine.fix_tetromino(), setup_fix)
+
+    engine.start("Marathon", seed=7)
+    game.recorder.stop()
+    engine.board.set_cells(stacked_board(Board, 10).cells)
+    game.full_redraw = True
+    results["game.draw[full_frame]"] = measure(game.draw, repeat=100, number=5)
+
+def scripted_play(pieces, seed=3):
+    #Deterministic inputs: rotate and shift by piece index, then hard drop
+    clock = VirtualClock()
+    engine = Engine(clock=clock)
+    engine.start("Marathon", seed)
+    for index in range(pieces):
+        if engine.over:
+            engine.start("Marathon", seed + index)
+        for _ in range(index % 4):
+            engine.apply("rotate_cw")
+        shift = index % 9 - 4
+        for _ in range(abs(shift)):
+            engine.apply("left" if shift < 0 else "right")
+        engine.apply("hard_drop")
+        clock.advance(16)
+        engine.update()
+    return engine
+
+def autoplay(pieces, seed=3):
+    #Search-driven play, the same bot as Game autoplay
+    engine = Engine(clock=VirtualClock())
+    engine.start("Marathon", seed)
+    for _ in range(pieces):
+        if engine.over:
+            engine.start("Marathon", seed)
+        placement = best_placement(engine.board, engine.current_tetromino)
+        for action in placement.path if placement else ():
+            engine.apply(action)
+        engine.apply("hard_drop")
+    return engine
+
+def bench_scenarios(results, game):
+    results["scenario.scripted_play[1000_pieces]"] = measure(lambda: scripted_play(1000), repeat=10, number=1)
+    results["scenario.autoplay[200_pieces]"] = measure(lambda: autoplay(200), repeat=5, number=1)
+
+    def frames():
+        game.engine.start("Marathon", seed=11)
+        game.recorder.stop()
+        game.autoplay = True
+        game.full_redraw = True
+        for _ in range(300):
+            for _ in range(SIMULATION_HZ // FPS):
+                game.simulate_tick()
+            game.draw()
+        game.autoplay = False
+    results["scenario.game_frames[300_autoplay_240hz_ticks]"] = measure(frames, repeat=5, number=1)
+
+def run_suite(game):
+    #One pass over every benchmark
+    results = {}
+    for bench in (bench_is_valid_position, bench_clear_lines, bench_rotation, bench_ghost):
+        bench(results)
+    bench_game(results, game)
+    bench_scenarios(results, game)
+    return results
+
+def best_of(runs):
+    #Per benchmark the run with the lowest p50, with every run's p50 and their spread (max / min).
+    #Background load only ever slows a run down, so the fastest run is the most repeatable one
+    best = {}
+    for name in runs[0]:
+        p50s = [run[name]["p50"] for run in runs]
+        result = dict(min((run[name] for run in runs), key=lambda result: result["p50"]))
+        result["runs"] = p50s
+        result["spread"] = max(p50s) / min(p50s) if min(p50s) else 1.0
+        best[name] = result
+    return best
+
+def compare(results, baseline, threshold):
+    #Ratio of best p50 against the baseline, a regression when above threshold.
+    #The run to run spread of both sides is reported alongside, it does not move the limit
+    report = {}
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        ratio = result["p50"] / reference["p50"] if reference["p50"] else float("inf")
+        report[name] = {"baseline_p50": reference["p50"], "p50": result["p50"], "ratio": ratio,
+                        "baseline_spread": reference.get("spread"), "spread": result.get("spread"),
+                        "regression": ratio > threshold}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Tetris engine and renderer benchmarks")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="best p50 ratio counted as a regression")
+    parser.add_argument("--runs", type=int, default=3, help="suite passes, each benchmark keeps its fastest")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    args = parser.parse_args()
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    game = make_game()
+    runs = [run_suite(game) for _ in range(max(1, args.runs))]
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        #Confirm suspected regressions with one more pass before reporting them
+        if any(entry["regression"] for entry in compare(best_of(runs), baseline, args.threshold).values()):
+            runs.append(run_suite(game))
+    results = best_of(runs)
+    if args.filter:
+        results = {name: result for name, result in results.items() if args.filter in name}
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "runs": len(runs)
+        },
+        "results": results
+    }
+    if baseline is not None:
+        output["comparison"] = compare(results, baseline, args.threshold)
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(text)
+
+    regressions = [name for name, entry in output.get("comparison", {}).items() if entry["regression"]]
+    for name in regressions:
+        entry = output["comparison"][name]
+        print(f"REGRESSION {name}: {entry['ratio']:.2f}x baseline p50, limit {args.threshold:.2f}x, "
+              f"spread {entry['spread']:.2f} (baseline {entry['baseline_spread'] or 1.0:.2f})", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
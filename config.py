@@ -4,6 +4,20 @@
 SCREEN_WIDTH = 1100      #Screen width
 SCREEN_HEIGHT = 650     #Screen height
 FPS = 60                #FPS
+VSYNC = False           #Pace rendering by the display refresh instead of FPS, needs RENDER_MODE "canvas"
+WINDOW_MODE = "windowed" #"windowed", "resizable" or "fullscreen"
+RENDER_MODE = "canvas"  #"canvas" draws at SCREEN_WIDTH x SCREEN_HEIGHT and the display scales each frame to the window,
+                        #"native" draws sprites, fonts and the board at the window's resolution, rebuilt once per resize
+BOARD_MARGIN = 20       #Space left of and above the board
+HUD_LINE_HEIGHT = 30    #Spacing of the HUD lines right of the board
+PREVIEW_CELL = 20       #Cell spacing of the next and hold previews
+SIMULATION_HZ = 240     #Fixed simulation ticks per second, independent of the render rate
+MAX_CATCH_UP = 250      #Longest frame time (ms) the simulation catches up on, longer stalls slow the game down
+IDLE_TIMEOUT = 500      #Longest wait (ms) for input in menus, pause and game over before the loop wakes up
+DIRTY_RENDERING = False #Push only changed screen regions while playing (toggle with F2)
+PROFILER_OVERLAY = False #Show frame phase timings next to the HUD (toggle with F3)
+PROFILER_WINDOW = 240   #Frames kept for rolling frame time percentiles
+PROFILER_CSV = None     #Write every frame's phase timings to this CSV file
 
 # =============================================
 #GRID PARAMETRS
@@ -11,6 +25,9 @@ FPS = 60                #FPS
 CELL_SIZE = 30          #Cell size in pixels
 GRID_COLS = 10          #Amount of columns
 GRID_ROWS = 20          #A,ount of rows
+VIEWPORT_COLS = 10      #Columns shown at once, the view follows the active piece on wider boards
+VIEWPORT_ROWS = 20      #Rows shown at once, the view follows the active piece on taller boards
+VIEWPORT_MARGIN = 3     #Cells kept between the active piece and the viewport edge
 
 WALL_KICK_I = {
     0: [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2), (2, 0), (2, -1)],  # 0 -> 1
@@ -135,10 +152,39 @@ DEFAULT_KEY_BINDINGS = {
     "pause": "p"
 }
 
+DAS = 167                       #Delay before a held left or right key starts repeating (ms)
+ARR = 33                        #Interval between left or right repeats (ms), 0 moves to the wall at once
+SOFT_DROP_ARR = 33              #Interval between soft drop repeats while down is held (ms), 0 drops at once
+
+# =============================================
+#AUTOPLAY
+# =============================================
+AUTOPLAY_MOVE_DELAY = 60    #Delay between autoplay inputs (ms), 0 plays a whole placement at once
+AUTOPLAY_WEIGHTS = {}       #Overrides for search.Heuristic weights
+
+# =============================================
+#VERSUS
+# =============================================
+VERSUS_PLAYERS = 2          #Boards in a local versus match (2 to 8)
+VERSUS_KEY_BINDINGS = [     #Keys of each human player, players without bindings are played by autoplay
+    {"left": "a", "right": "d", "down": "s", "hard_drop": "w", "rotate_cw": "e", "rotate_ccw": "q", "hold": "left shift"},
+    {"left": "left", "right": "right", "down": "down", "hard_drop": "up", "rotate_cw": "right ctrl", "rotate_ccw": "right shift", "hold": "return"}
+]
+GARBAGE_LINES = {1: 0, 2: 1, 3: 2, 4: 4}   #Garbage rows sent for each number of lines cleared at once
+GARBAGE_COLOR = (128, 128, 128)             #Color of garbage cells
+
 # =============================================
 #ADDITIONAL SETTINGS
 # =============================================
 PREVIEW_SCALE = 0.6         #Preview scale
+RECORD_REPLAYS = True       #Save a replay of every finished game to PATHS["replays"]
+TRACE_CATEGORIES = []       #Trace categories to record: rotation, kicks, bag, locks, clears
+LOG_LEVEL = "ERROR"         #Lowest level written to tetris.log, "INFO" adds the startup, versus and stream reports
+LOG_MAX_BYTES = 1000000     #Rotate tetris.log after this size
+LOG_BACKUP_COUNT = 3        #Rotated log files to keep
+PERSIST_INTERVAL = 2.0      #Seconds high score and save writes are coalesced before they hit the disk
+STARTUP_REPORT = True       #Log time to first frame and asset load times, at INFO level
+SPECTATOR_STREAM = None     #Publish game state for spectators to this file, or serve it on "tcp://host:port"
 
 # =============================================
 #PATHS
@@ -153,5 +199,6 @@ PATHS = {
         "hard_drop": "assets/sounds/hard_drop.wav",
         "line_clear": "assets/sounds/line_clear.wav",
         "game_over": "assets/sounds/game_over.wav"
-        }
+        },
+    "replays": "replays"
     }
\ No newline at end of file
@@ -1,9 +1,19 @@
-from .game import Game
+from .engine import Engine, VirtualClock, FixedStepClock
+from .board import Board
 from .tetromino import Tetromino, TetrominoBag
-from .grid import Grid
 from .settings import Settings
 from .save_game import SaveGame
 
-__all__ = ["Game", "Tetromino", "TetrominoBag", "Grid", "Settings", "SaveGame"]
+__all__ = ["Game", "Engine", "VirtualClock", "FixedStepClock", "Board", "Tetromino", "TetrominoBag", "Grid", "Settings", "SaveGame"]
 
-__version__ = "1.2.0"
\ No newline at end of file
+__version__ = "1.2.0"
+
+def __getattr__(name):
+    #Import pygame-backed classes only when they are requested
+    if name == "Game":
+        from .game import Game
+        return Game
+    if name == "Grid":
+        from .grid import Grid
+        return Grid
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+import pygame
+from config import PATHS
+
+class AssetManager:
+    #Sounds decode on a background thread, or on first use if they are needed earlier,
+    #fonts are loaded once per size. Every load is timed in milliseconds in timings
+    def __init__(self, paths=PATHS):
+        self.sound_paths = paths["sounds"]
+        self.font_path = paths["fonts"]["main"]
+        self.sounds = {}
+        self.fonts = {}
+        self.timings = {}
+        self.mixer_ready = None
+        #lock guards sounds and loading, never held while decoding. loading maps a sound being
+        #decoded to an Event set when it is done, so only callers of that sound wait for it
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.mixer_lock = threading.Lock()
+        self.loader = None
+
+    def timed(self, name, load, *args):
+        started = time.perf_counter()
+        try:
+            return load(*args)
+        finally:
+            self.timings[name] = (time.perf_counter() - started) * 1000
+
+    def preload_sounds(self):
+        #Open the mixer and decode all sounds on a background thread
+        if self.loader is None:
+            self.loader = threading.Thread(target=self.load_sounds, name="asset-loader", daemon=True)
+            self.loader.start()
+
+    def load_sounds(self):
+        for name in self.sound_paths:
+            self.sound(name)
+
+    def init_mixer(self):
+        #Open the audio device once, sounds are disabled if that fails
+        with self.mixer_lock:
+            if self.mixer_ready is None:
+                try:
+                    self.timed("mixer", pygame.mixer.init)
+                    self.mixer_ready = True
+                except Exception as e:
+                    logging.error(f"Failed to initialize mixer: {e}")
+                    self.mixer_ready = False
+        return self.mixer_ready
+
+    def sound(self, name):
+        #Decoded sound, loaded now if the background loader has not reached it, None if unavailable
+        if name in self.sounds:
+            return self.sounds[name]
+        with self.lock:
+            if name in self.sounds:
+                return self.sounds[name]
+            done = self.loading.get(name)
+            if done is None:
+                done = self.loading[name] = threading.Event()
+                decode = True
+            else:
+                decode = False
+        if not decode:
+            #Another thread is decoding this sound
+            done.wait()
+            return self.sounds.get(name)
+        sound = None
+        try:
+            if self.init_mixer():
+                sound = self.timed(f"sound:{name}", pygame.mixer.Sound, self.sound_paths[name])
+        except Exception as e:
+            logging.error(f"Failed to load sound {name}: {e}")
+        finally:
+            with self.lock:
+                self.sounds[name] = sound
+                del self.loading[name]
+            done.set()
+        return sound
+
+    def play(self, name):
+        sound = self.sound(name)
+        if sound is not None:
+            sound.play()
+
+    def font(self, size):
+        #Main font at a size, the system font if it cannot be loaded
+        font = self.fonts.get(size)
+        if font is None:
+            try:
+                font = self.timed(f"font:{size}", pygame.font.Font, self.font_path, size)
+            except Exception as e:
+                logging.error(f"Failed to load font: {e}")
+                font = pygame.font.SysFont("arial", size)
+            self.fonts[size] = font
+        return font
+
+    def report(self):
+        #Load times, slowest first
+        return [f"{name}: {ms:.1f} ms" for name, ms in sorted(self.timings.items(), key=lambda item: -item[1])]
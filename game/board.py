@@ -0,0 +1,157 @@
+class Board:
+    def __init__(self, rows=20, cols=10):
+        #Initialize board state without any rendering
+        self.rows = rows
+        self.cols = cols
+        self.full_mask = (1 << self.cols) - 1
+        #Bitboard: one integer per row, bit x set when column x is occupied
+        self.bits = [0] * self.rows
+        #Colors of occupied cells, used only for rendering and saving
+        self.cells = [[0 for _ in range(self.cols)] for _ in range(self.rows)]
+        self.cleared_lines = []
+        #Skyline index: surface height and occupied cell count of every column
+        self.heights = [0] * self.cols
+        self.column_counts = [0] * self.cols
+
+    def set_cells(self, cells):
+        #Replace board contents and rebuild the bitboard from colors
+        self.cells = [list(row) for row in cells]
+        self.bits = [sum(1 << x for x, cell in enumerate(row) if cell) for row in self.cells]
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        #Recompute column heights and counts from the bitboard
+        self.heights = [self.column_height(x) for x in range(self.cols)]
+        self.column_counts = [sum(row >> x & 1 for row in self.bits) for x in range(self.cols)]
+
+    def column_height(self, x, start=0):
+        #Height of the highest occupied cell of column x at or below row start
+        bit = 1 << x
+        for y in range(start, self.rows):
+            if self.bits[y] & bit:
+                return self.rows - y
+        return 0
+
+    def is_valid_position(self, tetromino, offset_x, offset_y):
+        #Check if tetromino can be placed
+        return self.fits(tetromino.get_masks(), offset_x, offset_y)
+
+    def fits(self, masks, offset_x, offset_y):
+        #Check if precomputed row masks fit at the given offset
+        min_x, max_x, rows = masks
+        if offset_x + min_x < 0 or offset_x + max_x >= self.cols:
+            return False
+        shift = offset_x + min_x
+        bits = self.bits
+        for dy, mask in rows:
+            grid_y = offset_y + dy
+            if grid_y >= self.rows:
+                return False
+            if grid_y >= 0 and bits[grid_y] & (mask << shift):
+                return False
+        return True
+
+    def place(self, tetromino):
+        #Write tetromino cells into the board, False if it sticks out of the top.
+        #A topped out piece leaves the board unchanged, the stack layer is never patched for it
+        color = tetromino.color
+        orientation = tetromino.orientation
+        if tetromino.y + orientation.bounding_box[2] < 0:
+            return False
+        heights = self.heights
+        for x, y in orientation.cells:
+            grid_y = tetromino.y + y
+            grid_x = tetromino.x + x
+            self.cells[grid_y][grid_x] = color
+            self.bits[grid_y] |= 1 << grid_x
+            self.column_counts[grid_x] += 1
+            if self.rows - grid_y > heights[grid_x]:
+                heights[grid_x] = self.rows - grid_y
+        return True
+
+    def clear_lines(self, rows=None):
+        #Clear completed lines, only the given rows are checked when rows is not None
+        full_mask = self.full_mask
+        bits = self.bits
+        candidates = range(self.rows) if rows is None else sorted(rows)
+        lines_to_clear = [idx for idx in candidates if 0 <= idx < self.rows and bits[idx] == full_mask]
+        if lines_to_clear:
+            self.cleared_lines = [(idx, self.cells[idx]) for idx in lines_to_clear]
+            count = len(lines_to_clear)
+            for idx in reversed(lines_to_clear):
+                del bits[idx]
+                del self.cells[idx]
+            bits[:0] = [0] * count
+            self.cells[:0] = [[0] * self.cols for _ in range(count)]
+            #Every cleared row lies at or below each column's top, so heights drop by count
+            #unless the top cell itself was cleared, then that column is rescanned
+            cleared = set(lines_to_clear)
+            for x in range(self.cols):
+                self.column_counts[x] -= count
+                top = self.rows - self.heights[x]
+                if top in cleared:
+                    self.heights[x] = self.column_height(x, top + 1)
+                else:
+                    self.heights[x] -= count
+        return len(lines_to_clear)
+
+    def add_garbage(self, count, hole, color):
+        #Push the stack up by count garbage rows with an empty cell in column hole,
+        #False if locked cells were pushed out of the top
+        count = min(count, self.rows)
+        overflow = any(self.bits[:count])
+        del self.bits[:count]
+        del self.cells[:count]
+        self.bits.extend([self.full_mask & ~(1 << hole)] * count)
+        self.cells.extend([0 if x == hole else color for x in range(self.cols)] for _ in range(count))
+        if overflow:
+            self.rebuild_index()
+        else:
+            for x in range(self.cols):
+                if x != hole:
+                    self.heights[x] += count
+                    self.column_counts[x] += count
+                elif self.heights[x]:
+                    self.heights[x] += count
+        return not overflow
+
+    def drop_distance(self, tetromino):
+        #Rows the tetromino can fall, from the skyline when every column of the piece is
+        #above its surface, by stepping down when it is tucked under an overhang
+        x, y = tetromino.x, tetromino.y
+        heights = self.heights
+        distance = self.rows
+        for dx, dy in tetromino.orientation.bottoms:
+            gap = self.rows - heights[x + dx] - (y + dy) - 1
+            if gap < 0:
+                distance = 0
+                while self.is_valid_position(tetromino, x, y + distance + 1):
+                    distance += 1
+                return distance
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def get_ghost_position(self, tetromino):
+        #Calculate ghost tetromino position
+        return tetromino.x, tetromino.y + self.drop_distance(tetromino)
+
+    def max_height(self):
+        return max(self.heights)
+
+    def holes(self):
+        #Empty cells below each column's surface
+        return sum(self.heights) - sum(self.column_counts)
+
+    def bumpiness(self):
+        #Sum of height differences between neighbouring columns
+        heights = self.heights
+        return sum(abs(heights[x] - heights[x + 1]) for x in range(self.cols - 1))
+
+    def reset(self):
+        #Reset board
+        self.bits = [0] * self.rows
+        self.cells = [[0 for _ in range(self.cols)] for _ in range(self.rows)]
+        self.cleared_lines = []
+        self.heights = [0] * self.cols
+        self.column_counts = [0] * self.cols
@@ -0,0 +1,298 @@
+import random
+import time
+from config import SCORE_DATA, LINES_PER_LEVEL, LEVEL_SPEED_REDUCTION, GAME_MODES, LOCK_DELAY, FADE_DURATION, GRID_ROWS, GRID_COLS, GARBAGE_COLOR
+from .tetromino import TetrominoBag
+from .board import Board
+from .trace import TRACE
+
+def monotonic_ms():
+    #Default engine clock in milliseconds
+    return int(time.monotonic() * 1000)
+
+class VirtualClock:
+    #Manually advanced clock for headless simulation
+    def __init__(self, start=0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms
+        return self.now
+
+class FixedStepClock:
+    #Simulation clock advanced in whole ticks at a fixed rate, reads in milliseconds
+    def __init__(self, hz, ticks=0):
+        self.hz = hz
+        self.ticks = ticks
+
+    def __call__(self):
+        return self.ticks * 1000 // self.hz
+
+    def step(self):
+        self.ticks += 1
+        return self()
+
+class Engine:
+    #Game rules without any rendering, audio or pygame dependency
+    def __init__(self, board=None, clock=None):
+        self.board = board if board is not None else Board(GRID_ROWS, GRID_COLS)
+        self.clock = clock if clock is not None else monotonic_ms
+        #Pieces spawn centered, column 3 on the standard 10 wide board
+        self.spawn_x = (self.board.cols - 4) // 2
+        self.listeners = []
+        self.game_mode = "Marathon"
+        self.seed = None
+        self.high_score = 0
+        self.actions = {
+            "left": lambda: self.move_horizontal(-1),
+            "right": lambda: self.move_horizontal(1),
+            "down": self.soft_drop,
+            "sonic_drop": self.sonic_drop,
+            "hard_drop": self.hard_drop,
+            "rotate_cw": lambda: self.rotate(clockwise=True),
+            "rotate_ccw": lambda: self.rotate(clockwise=False),
+            "hold": self.hold
+        }
+        self.reset_state()
+
+    def reset_state(self):
+        #Reset everything that belongs to a single game
+        self.board.reset()
+        self.bag = TetrominoBag(self.seed)
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.fall_speed = GAME_MODES[self.game_mode]["fall_speed"]
+        self.fall_time = 0
+        self.line_clear_delay = 0
+        self.lock_delay = 0
+        self.locked = False
+        self.current_tetromino = None
+        self.next_tetromino = None
+        self.held_tetromino = None
+        self.can_hold = True
+        self.over = False
+        #Garbage rows received from opponents, they rise when the next piece locks without a clear
+        self.pending_garbage = 0
+        self.garbage_rng = random.Random(self.seed)
+        self.now = self.clock()
+        self.start_time = self.now
+        self.stats = {
+            "tetrominos": {'I': 0, 'O': 0, 'T': 0, 'L': 0, 'J': 0, 'S': 0, 'Z': 0},
+            "lines": {1: 0, 2: 0, 3: 0, 4: 0},
+            "time": 0
+        }
+
+    def subscribe(self, listener):
+        #Register listener(event, *args) for engine events
+        self.listeners.append(listener)
+
+    def emit(self, event, *args):
+        for listener in self.listeners:
+            listener(event, *args)
+
+    def start(self, game_mode=None, seed=None):
+        #Start a new game, the seed fixes the tetromino sequence
+        if game_mode is not None:
+            self.game_mode = game_mode
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.reset_state()
+        self.emit("start", self.game_mode, self.seed)
+        self.current_tetromino = self.next_from_bag()
+        self.next_tetromino = self.next_from_bag()
+        self.emit("spawn", self.current_tetromino)
+
+    def next_from_bag(self):
+        #Next tetromino from the bag at the spawn column
+        tetromino = self.bag.get_next()
+        tetromino.x = self.spawn_x
+        return tetromino
+
+    def update(self):
+        #Advance gravity, lock delay and mode rules to the current clock time
+        if self.over:
+            return
+        current_time = self.now = self.clock()
+        self.emit("tick")
+        self.stats["time"] = (current_time - self.start_time) // 1000
+
+        #Mode goals come before the line clear and lock delays, which return early
+        if self.mode_finished(current_time):
+            self.game_over()
+            return
+
+        #Handle line clear delay
+        if self.line_clear_delay > 0:
+            if current_time - self.line_clear_delay >= FADE_DURATION:
+                self.line_clear_delay = 0
+            return
+
+        #Handle lock delay
+        if self.locked:
+            if current_time - self.lock_delay >= LOCK_DELAY:
+                self.fix_tetromino()
+                self.locked = False
+            return
+
+        #Automatic falling
+        if current_time - self.fall_time > self.fall_speed:
+            if not self.move_vertical():
+                self.locked = True
+                self.lock_delay = current_time
+            else:
+                self.fall_time = current_time
+                self.emit("fall", self.current_tetromino)
+
+    def mode_finished(self, current_time):
+        #True once the Sprint line goal or the Ultra time limit is reached
+        if self.game_mode == "Sprint":
+            return self.lines_cleared >= GAME_MODES["Sprint"]["goal"]
+        if self.game_mode == "Ultra":
+            return current_time - self.start_time >= GAME_MODES["Ultra"]["time_limit"]
+        return False
+
+    def move_horizontal(self, direction):
+        #Move tetromino horizontaly
+        new_x = self.current_tetromino.x + direction
+        if self.board.is_valid_position(self.current_tetromino, new_x, self.current_tetromino.y):
+            self.current_tetromino.x = new_x
+            self.locked = False
+            self.emit("move", self.current_tetromino)
+            return True
+        return False
+
+    def rotate(self, clockwise=True):
+        #Tetromino rotation
+        success = (self.current_tetromino.rotate_clockwise(self.board) if clockwise
+                   else self.current_tetromino.rotate_counterclockwise(self.board))
+        if success:
+            self.locked = False
+            self.emit("rotate", self.current_tetromino)
+        return success
+
+    def soft_drop(self):
+        #Preform soft drop
+        if self.move_vertical():
+            self.score += 1 * self.level
+            self.fall_time = self.now
+            self.locked = False
+            self.emit("soft_drop", self.current_tetromino)
+            return True
+        return False
+
+    def apply(self, action):
+        #Perform a named input action at the current clock time
+        self.now = self.clock()
+        self.emit("input", action)
+        return self.actions[action]()
+
+    def sonic_drop(self):
+        #Soft drop until the tetromino lands
+        distance = 0
+        while self.soft_drop():
+            distance += 1
+        return distance
+
+    def hard_drop(self):
+        #Perform hard drop, the distance comes from the board's column heights
+        drop_distance = self.board.drop_distance(self.current_tetromino)
+        self.current_tetromino.y += drop_distance
+        self.score += 2 * drop_distance * self.level
+        self.emit("hard_drop", self.current_tetromino, drop_distance)
+        self.fix_tetromino()
+
+    def hold(self):
+        #Hold tetromino in place
+        if not self.can_hold:
+            return False
+        if self.held_tetromino is None:
+            self.held_tetromino = self.current_tetromino
+            self.current_tetromino = self.next_from_bag()
+        else:
+            self.held_tetromino, self.current_tetromino = self.current_tetromino, self.held_tetromino
+            self.current_tetromino.respawn(self.spawn_x)
+        self.can_hold = False
+        self.locked = False
+        self.emit("hold", self.current_tetromino, self.held_tetromino)
+        return True
+
+    def move_vertical(self):
+        #Move tetromino down
+        new_y = self.current_tetromino.y + 1
+        if self.board.is_valid_position(self.current_tetromino, self.current_tetromino.x, new_y):
+            self.current_tetromino.y = new_y
+            return True
+        return False
+
+    def fix_tetromino(self):
+        #Lock tetromino and handle line clears
+        self.stats["tetrominos"][self.current_tetromino.shape_type] += 1
+        if not self.board.place(self.current_tetromino):
+            self.game_over()
+            return
+        if TRACE.locks:
+            TRACE.record("locks", "Locked %s rotation %d at x=%d, y=%d", self.current_tetromino.shape_type,
+                         self.current_tetromino.rotation, self.current_tetromino.x, self.current_tetromino.y)
+        self.emit("lock", self.current_tetromino)
+
+        #Only the rows the piece covers can have been completed
+        _, _, min_y, max_y = self.current_tetromino.orientation.bounding_box
+        lines_cleared = self.board.clear_lines(range(self.current_tetromino.y + min_y, self.current_tetromino.y + max_y + 1))
+        if lines_cleared > 0:
+            if TRACE.clears:
+                TRACE.record("clears", "Cleared rows %s", tuple(idx for idx, _ in self.board.cleared_lines))
+            self.update_score(lines_cleared)
+            self.line_clear_delay = self.now
+            self.stats["lines"][lines_cleared] += 1
+        elif self.pending_garbage:
+            count, self.pending_garbage = self.pending_garbage, 0
+            hole = self.garbage_rng.randrange(self.board.cols)
+            self.emit("garbage", count, hole)
+            if not self.board.add_garbage(count, hole, GARBAGE_COLOR):
+                self.game_over()
+                return
+
+        self.current_tetromino = self.next_tetromino
+        self.next_tetromino = self.next_from_bag()
+        self.can_hold = True
+        self.locked = False
+        self.emit("spawn", self.current_tetromino)
+
+        if not self.board.is_valid_position(self.current_tetromino, self.current_tetromino.x, self.current_tetromino.y):
+            self.game_over()
+
+    def receive_garbage(self, lines):
+        #Queue garbage rows sent by an opponent
+        self.pending_garbage += lines
+
+    def cancel_garbage(self, lines):
+        #Offset queued garbage with lines about to be sent, returns the lines left to send
+        cancelled = min(lines, self.pending_garbage)
+        self.pending_garbage -= cancelled
+        return lines - cancelled
+
+    def update_score(self, lines):
+        #Update score and level
+        self.score += SCORE_DATA.get(lines, 0) * self.level
+        self.lines_cleared += lines
+        new_level = 1 + self.lines_cleared // LINES_PER_LEVEL
+        if new_level > self.level:
+            self.level = new_level
+            self.fall_speed = max(50, 1000 - (self.level * LEVEL_SPEED_REDUCTION))
+            self.emit("level", self.level)
+        if lines > 0:
+            self.emit("clear", lines)
+        self.emit("score", self.score)
+        if self.score > self.high_score:
+            self.high_score = self.score
+            self.emit("high_score", self.high_score)
+
+    def game_over(self):
+        #Trigger game over
+        self.over = True
+        self.emit("game_over", self.score)
+        if self.score > self.high_score:
+            self.high_score = self.score
+            self.emit("high_score", self.high_score)
@@ -1,17 +1,25 @@
 import pygame
 import logging
 import os
-import json
 import time
-from config import SCREEN_WIDTH, SCREEN_HEIGHT, FPS, SCORE_DATA, LINES_PER_LEVEL, LEVEL_SPEED_REDUCTION, COLORS, GRID_COLS, GRID_ROWS, CELL_SIZE, PATHS, THEMES, GAME_MODES, DEFAULT_KEY_BINDINGS, LOCK_DELAY, FADE_DURATION
-from .tetromino import Tetromino, TetrominoBag
-from .grid import Grid
+from config import SCREEN_WIDTH, SCREEN_HEIGHT, FPS, VSYNC, WINDOW_MODE, RENDER_MODE, BOARD_MARGIN, HUD_LINE_HEIGHT, PREVIEW_CELL, SIMULATION_HZ, MAX_CATCH_UP, IDLE_TIMEOUT, DIRTY_RENDERING, PROFILER_OVERLAY, PROFILER_WINDOW, PROFILER_CSV, CELL_SIZE, PATHS, THEMES, GAME_MODES, TRACE_CATEGORIES, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, PERSIST_INTERVAL, STARTUP_REPORT, AUTOPLAY_MOVE_DELAY, AUTOPLAY_WEIGHTS, RECORD_REPLAYS, DAS, ARR, SOFT_DROP_ARR, VERSUS_PLAYERS, SPECTATOR_STREAM
+from .grid import Grid, union_rects
+from .sprites import SpriteCache
+from .text_cache import TextCache, GlyphAtlas
+from .trace import TRACE, configure_logging
+from .profiler import FrameProfiler
+from .search import Heuristic, Autopilot
+from .replay import ReplayRecorder, default_replay_path
+from .engine import Engine, FixedStepClock
 from .settings import Settings
 from .save_game import SaveGame
+from .storage import PersistenceService, write_text
+from .assets import AssetManager
+from .input import InputMap, AutoShift, REPEATING, apply_inputs
+from .versus import Versus
+from .stream import StatePublisher
 from enum import Enum
-
-#Logging
-logging.basicConfig(filename="tetris.log", level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
+from collections import deque
 
 #GameState class
 class GameState(Enum):
@@ -20,81 +28,85 @@ class GameState(Enum):
     PAUSED = 3
     PLAYING = 4
     GAME_OVER = 5
+    VERSUS = 6
+
+#Events that change an idle screen: key presses the screens handle, resizes and exposes
+REDRAW_EVENTS = (pygame.KEYDOWN, pygame.VIDEORESIZE, pygame.WINDOWSIZECHANGED, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+
+def preview_key(tetromino):
+    #Identity of a preview image, None when there is no tetromino
+    return (tetromino.shape_type, tetromino.rotation) if tetromino else None
+
+def hud_layout(board_width):
+    #Layout positions of the HUD items right of a board_width wide board, one line per item
+    #and four preview cells for each preview
+    x = BOARD_MARGIN + board_width
+    y = BOARD_MARGIN + HUD_LINE_HEIGHT
+    positions = {}
+    for key in ("score", "high_score", "level", "mode", "next_label", "next", "hold_label", "hold", "profiler"):
+        positions[key] = (x, y)
+        y += HUD_LINE_HEIGHT + (4 * PREVIEW_CELL if key in ("next", "hold") else 0)
+    return positions
 
 class Game:
     def __init__(self):
         #Initialize Tetris with Pygame, game state, and resources
+        self.started = time.perf_counter()
+        configure_logging(level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT)
+        if TRACE_CATEGORIES:
+            TRACE.enable(*TRACE_CATEGORIES)
         try:
-            pygame.init()
+            #Only the subsystems the menu needs, the mixer opens on the asset loader thread
+            pygame.display.init()
             pygame.font.init()
-            pygame.mixer.init()
         except Exception as e:
             logging.error(f"Failed to initialize Pygame: {e}")
             raise
 
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.game_surface = pygame.Surface((GRID_COLS * CELL_SIZE, GRID_ROWS * CELL_SIZE), pygame.SRCALPHA)
+        self.open_window()
         pygame.display.set_caption("Tetris")
 
         #Game state
         self.state = GameState.MENU
         self.final_score = 0
-        self.high_score = self.load_high_score()
-        self.start_time = 0
         self.game_mode = "Marathon"
         self.settings = Settings()
         self.current_theme = self.settings.get_theme()
         self.key_bindings = self.settings.get_key_bindings()
 
-        #Time management
+        #Time management, the engine runs on fixed simulation ticks fed by an accumulator
         self.clock = pygame.time.Clock()
-        self.fall_time = 0
-        self.fall_speed = GAME_MODES[self.game_mode]["fall_speed"]
-        self.line_clear_delay = 0
-        self.lock_delay = 0
-        self.locked = False
+        self.sim_clock = FixedStepClock(SIMULATION_HZ)
+        self.tick_ms = 1000 / SIMULATION_HZ
+        self.accumulator = 0.0
+        self.last_frame_time = None
 
         #Game components
-        self.grid = Grid()
+        self.sprites = SpriteCache()
+        self.grid = Grid(self.sprites)
         self.grid.current_theme = self.current_theme
-        self.bag = TetrominoBag()
-
-        #Level and score management
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-
-        #Tetromino management
-        self.current_tetromino = None
-        self.next_tetromino = None
-        self.held_tetromino = None
-        self.can_hold = True
-
-        #Input delay
-        self.move_delay = 150
-        self.last_move_time = 0
-
-        #Sounds
-        self.sounds = {}
-        try:
-            self.sounds = {
-                "rotate": pygame.mixer.Sound(PATHS["sounds"]["rotate"]),
-                "drop": pygame.mixer.Sound(PATHS["sounds"]["drop"]),
-                "hard_drop": pygame.mixer.Sound(PATHS["sounds"]["hard_drop"]),
-                "line_clear": pygame.mixer.Sound(PATHS["sounds"]["line_clear"]),
-                "game_over": pygame.mixer.Sound(PATHS["sounds"]["game_over"])
-            }
-        except Exception as e:
-            logging.error(f"Failed to load sounds: {e}")
-
-        #Font
-        try:
-            self.font = pygame.font.Font(PATHS["fonts"]["main"], 18)
-            self.menu_font = pygame.font.Font(PATHS["fonts"]["main"], 24)
-        except Exception as e:
-            logging.error(f"Failed to load font: {e}")
-            self.font = pygame.font.SysFont("arial", 18)
-            self.menu_font = pygame.font.SysFont("arial", 24)
+        #The board shows the grid's viewport, the HUD sits to its right
+        self.hud = hud_layout(self.grid.view_cols * CELL_SIZE)
+        self.engine = Engine(self.grid, self.sim_clock)
+        self.engine.high_score = self.load_high_score()
+        self.recorder = ReplayRecorder(self.engine)
+        self.engine.subscribe(self.on_engine_event)
+        self.publisher = StatePublisher(SPECTATOR_STREAM, self.engine) if SPECTATOR_STREAM else None
+
+        #Input, key presses and releases are applied on the next simulation tick
+        self.input_map = InputMap(self.key_bindings)
+        self.auto_shift = AutoShift(DAS, ARR, SOFT_DROP_ARR)
+        self.pending_inputs = deque()
+        self.waited_events = []
+        self.redraw_pending = True
+
+        #Sounds decode in the background while the menu is up, fonts are cached per size
+        self.assets = AssetManager()
+        self.assets.preload_sounds()
+
+        #Text rendering caches
+        self.text_cache = TextCache()
+        self.glyph_atlases = {}
 
         #Menu options
         self.modes = list(GAME_MODES.keys())
@@ -102,42 +114,187 @@ class Game:
         self.themes = list(THEMES.keys())
         self.selected_theme = self.current_theme
 
-        #Statistics
-        self.stats = {
-            "tetrominos": {'I': 0, 'O': 0, 'T': 0, 'L': 0, 'J': 0, 'S': 0, 'Z': 0},
-            "lines": {1: 0, 2: 0, 3: 0, 4: 0},
-            "time": 0
-        }
+        #Write-behind for high scores and saves
+        self.storage = PersistenceService(PERSIST_INTERVAL)
 
         #Settings state
         self.key_to_rebind = None
         self.waiting_for_key = False
 
+        #Autoplay
+        self.autoplay = False
+        self.autopilot = Autopilot(Heuristic(AUTOPLAY_WEIGHTS), AUTOPLAY_MOVE_DELAY)
+
+        #Local versus match, created on first use
+        self.versus = None
+
+        #Dirty rectangle rendering
+        self.dirty_rendering = DIRTY_RENDERING
+        self.full_redraw = True
+        self.board_dirty = True
+        self.rendered_state = None
+        self.dirty_rects = []
+        self.last_board_rect = pygame.Rect(0, 0, 0, 0)
+        self.hud_items = {}
+        self.updated_pixels = 0
+        #Pixels pushed to the display by recent gameplay frames, shown in the profiler overlay
+        self.pixel_samples = deque(maxlen=PROFILER_WINDOW)
+
+        #Frame profiler
+        self.profiler = FrameProfiler(1000 / FPS, PROFILER_WINDOW, PROFILER_CSV)
+        self.show_profiler = PROFILER_OVERLAY
+        self.profiler_lines = ()
+
+        #Fonts, sprites and board layers at the output resolution
+        self.rescale()
+
+    def open_window(self):
+        #In canvas mode the game draws at SCREEN_WIDTH x SCREEN_HEIGHT and SDL scales every frame to the
+        #window on the GPU, in native mode the display surface is the window and everything is drawn at its size
+        flags = {"windowed": 0, "resizable": pygame.RESIZABLE, "fullscreen": pygame.FULLSCREEN}[WINDOW_MODE]
+        if RENDER_MODE == "canvas" and (flags or VSYNC):
+            flags |= pygame.SCALED
+        size = (0, 0) if RENDER_MODE == "native" and flags & pygame.FULLSCREEN else (SCREEN_WIDTH, SCREEN_HEIGHT)
+        #Vsync needs the SDL renderer behind SCALED
+        self.vsync = VSYNC and bool(flags & pygame.SCALED)
+        self.screen = pygame.display.set_mode(size, flags, vsync=1 if self.vsync else 0)
+
+    def rescale(self):
+        #Scale the SCREEN_WIDTH x SCREEN_HEIGHT layout to the screen, letterboxed, and rebuild fonts, sprites
+        #and board layers at that scale. Runs once per screen size, every frame after reuses the cached assets
+        width, height = self.screen_size = self.screen.get_size()
+        self.scale = min(width / SCREEN_WIDTH, height / SCREEN_HEIGHT)
+        self.origin = ((width - round(SCREEN_WIDTH * self.scale)) // 2, (height - round(SCREEN_HEIGHT * self.scale)) // 2)
+        self.font = self.assets.font(self.px(18))
+        self.menu_font = self.assets.font(self.px(24))
+        self.small_font = self.assets.font(self.px(14))
+        self.text_cache.clear()
+        self.glyph_atlases.clear()
+        #Cells round down so the board never grows into the HUD
+        self.grid.set_cell_size(max(1, int(CELL_SIZE * self.scale)))
+        self.game_surface = pygame.Surface((self.grid.view_cols * self.grid.cell_size, self.grid.view_rows * self.grid.cell_size), pygame.SRCALPHA)
+        self.board_origin = self.point((BOARD_MARGIN, BOARD_MARGIN))
+        if self.versus is not None:
+            self.versus.resize(self.screen_size, self.scale)
+        self.hud_items = {}
+        self.full_redraw = True
+
+    def on_resize(self):
+        #The window changed size, in native mode the scaled assets are rebuilt once for the new size
+        self.full_redraw = True
+        if RENDER_MODE == "native":
+            self.screen = pygame.display.get_surface()
+            if self.screen.get_size() != self.screen_size:
+                self.rescale()
+
+    def px(self, length):
+        #Layout length in screen pixels
+        return max(1, round(length * self.scale))
+
+    def point(self, position):
+        #Layout position in screen pixels
+        return (self.origin[0] + round(position[0] * self.scale), self.origin[1] + round(position[1] * self.scale))
+
     def run(self):
-        #Run the main game loop
+        #Run the main game loop, every phase of a frame is timed by the profiler
+        phases = {
+            GameState.MENU: (self.handle_menu_events, None, self.draw_menu),
+            GameState.SETTINGS: (self.handle_settings_events, None, self.draw_settings),
+            GameState.PAUSED: (self.handle_pause_events, None, self.draw_pause),
+            GameState.PLAYING: (self.handle_events, self.update, self.draw),
+            GameState.GAME_OVER: (self.handle_game_over_events, None, self.draw_game_over),
+            GameState.VERSUS: (self.handle_versus_events, self.update_versus, self.draw_versus)
+        }
+        profiler = self.profiler
+        drawn_state = None
         while True:
-            self.clock.tick(FPS)
-            if self.state == GameState.MENU:
-                self.handle_menu_events()
-                self.draw_menu()
-            elif self.state == GameState.SETTINGS:
-                self.handle_settings_events()
-                self.draw_settings()
-            elif self.state == GameState.PAUSED:
-                self.handle_pause_events()
-                self.draw_pause()
-            elif self.state == GameState.PLAYING:
-                self.handle_events()
-                self.update()
-                self.draw()
-            elif self.state == GameState.GAME_OVER:
-                self.handle_game_over_events()
-                self.draw_game_over()
+            profiler.begin_frame()
+            state = self.state
+            handle_events, update, draw = phases[state]
+            idle = update is None
+            if idle and state == drawn_state and not self.redraw_pending:
+                #Nothing changes outside of gameplay until an event arrives
+                self.wait_for_events(IDLE_TIMEOUT)
+            else:
+                self.clock.tick(0 if self.vsync else FPS)
+            profiler.mark("tick")
+            handle_events()
+            profiler.mark("events")
+            if not idle:
+                update()
+                profiler.mark("update")
+            else:
+                #Simulation time does not pass outside of gameplay
+                self.last_frame_time = None
+                if state == drawn_state and not self.redraw_pending:
+                    profiler.end_frame(state.name, idle)
+                    continue
+            draw()
+            profiler.mark("draw")
+            self.present()
+            profiler.mark("present")
+            profiler.end_frame(state.name, idle)
+            if drawn_state is None:
+                self.report_startup()
+            drawn_state = state
+            self.redraw_pending = False
+
+    def report_startup(self):
+        #Log time to first frame and asset load times
+        self.assets.timings["first_frame"] = (time.perf_counter() - self.started) * 1000
+        if STARTUP_REPORT:
+            logging.getLogger("tetris.startup").info("Startup: %s", ", ".join(self.assets.report()))
+
+    def wait_for_events(self, timeout):
+        #Block until an event arrives or timeout ms pass, the event is kept for poll_events
+        event = pygame.event.wait(timeout)
+        if event.type != pygame.NOEVENT:
+            self.waited_events.append(event)
+
+    def poll_events(self):
+        #Events since the last poll, idle screens are redrawn only for events that can change them
+        events = self.waited_events + pygame.event.get()
+        self.waited_events = []
+        if any(event.type in REDRAW_EVENTS for event in events):
+            self.redraw_pending = True
+        if any(event.type == pygame.WINDOWSIZECHANGED for event in events):
+            self.on_resize()
+        return events
+
+    def present(self):
+        #Push the frame to the display, only dirty regions while playing in dirty mode
+        if not self.dirty_rendering or self.needs_full_redraw():
             pygame.display.flip()
+            self.updated_pixels = self.screen.get_width() * self.screen.get_height()
+        else:
+            pygame.display.update(self.dirty_rects)
+            self.updated_pixels = sum(rect.width * rect.height for rect in self.dirty_rects)
+        if self.state == GameState.PLAYING:
+            self.pixel_samples.append(self.updated_pixels)
+        self.dirty_rects = []
+        self.full_redraw = False
+        self.board_dirty = False
+        self.rendered_state = self.state
+
+    def needs_full_redraw(self):
+        #Full redraw on state transitions, theme changes and outside of gameplay
+        return self.full_redraw or self.state != GameState.PLAYING or self.rendered_state != GameState.PLAYING
+
+    def toggle_dirty_rendering(self):
+        #Switch between dirty rectangle updates and full flips
+        self.dirty_rendering = not self.dirty_rendering
+        self.full_redraw = True
+        self.pixel_samples.clear()
+
+    def toggle_profiler(self):
+        #Show or hide the frame timing overlay
+        self.show_profiler = not self.show_profiler
+        self.profiler_lines = ()
+        self.full_redraw = True
 
     def handle_menu_events(self):
         #Handle main menu events
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -149,7 +306,13 @@ class Game:
                     current_idx = self.modes.index(self.selected_mode)
                     self.selected_mode = self.modes[(current_idx + 1) % len(self.modes)]
                 if event.key == pygame.K_RETURN:
+                    self.autoplay = False
                     self.start_game()
+                if event.key == pygame.K_a:
+                    self.autoplay = True
+                    self.start_game()
+                if event.key == pygame.K_v:
+                    self.start_versus()
                 if event.key == pygame.K_s:
                     self.state = GameState.SETTINGS
                 if event.key == pygame.K_l:
@@ -160,7 +323,7 @@ class Game:
 
     def handle_settings_events(self):
         #Handle settings menu events
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -168,6 +331,7 @@ class Game:
                 if self.waiting_for_key:
                     self.key_bindings[self.key_to_rebind] = pygame.key.name(event.key)
                     self.settings.save_key_bindings(self.key_bindings)
+                    self.input_map.compile(self.key_bindings)
                     self.waiting_for_key = False
                     self.key_to_rebind = None
                 else:
@@ -182,6 +346,8 @@ class Game:
                         self.current_theme = self.selected_theme
                         self.grid.current_theme = self.current_theme
                         self.grid.update_theme()
+                        self.versus = None
+                        self.full_redraw = True
                         self.screen.fill(THEMES[self.current_theme]["background"])
                         pygame.display.flip()
                     if event.key == pygame.K_1:
@@ -213,13 +379,15 @@ class Game:
 
     def handle_pause_events(self):
         #Handle pause menu events
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
                     self.state = GameState.PLAYING
+                    #Key releases during the pause were not seen
+                    self.auto_shift.release_all()
                 if event.key == pygame.K_s:
                     self.save_game()
                 if event.key == pygame.K_ESCAPE:
@@ -228,7 +396,7 @@ class Game:
 
     def handle_game_over_events(self):
         #Handle gameplay events
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -241,81 +409,132 @@ class Game:
 
     def handle_events(self):
         #Update game state
-        for event in pygame.event.get():
+        for event in self.poll_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
             if event.type == pygame.KEYDOWN:
-                key_name = pygame.key.name(event.key)
-                actions = {
-                    self.key_bindings["rotate_cw"]: lambda: self.rotate_tetromino(clockwise=True),
-                    self.key_bindings["rotate_ccw"]: lambda: self.rotate_tetromino(clockwise=False),
-                    self.key_bindings["hard_drop"]: lambda: self.hard_drop(),
-                    self.key_bindings["hold"]: lambda: self.hold_tetromino(),
-                    self.key_bindings["pause"]: lambda: setattr(self, 'state', GameState.PAUSED)
-                }
-                if key_name in actions:
-                    actions[key_name]()
-
-        current_time = pygame.time.get_ticks()
-        keys = pygame.key.get_pressed()
-        move_actions = {
-            self.key_bindings["left"]: lambda: self.move_horizontal(-1),
-            self.key_bindings["right"]: lambda: self.move_horizontal(1),
-            self.key_bindings["down"]: lambda: self.soft_drop()
-        }
-        for key, action in move_actions.items():
-            if keys[pygame.key.key_code(key)] and current_time - self.last_move_time > self.move_delay:
-                action()
-                self.last_move_time = current_time
+                action = self.input_map.get(event.key)
+                if action == "pause":
+                    self.state = GameState.PAUSED
+                elif action is not None:
+                    self.pending_inputs.append((True, action))
+                elif event.key == pygame.K_F2:
+                    self.toggle_dirty_rendering()
+                elif event.key == pygame.K_F3:
+                    self.toggle_profiler()
+                elif event.key == pygame.K_F4:
+                    self.autoplay = not self.autoplay
+            elif event.type == pygame.KEYUP:
+                action = self.input_map.get(event.key)
+                if action in REPEATING:
+                    self.pending_inputs.append((False, action))
+            elif event.type == pygame.WINDOWFOCUSLOST:
+                self.auto_shift.release_all()
 
     def update(self):
-        #Update game state
-        if self.state != GameState.PLAYING:
-            return
-
-        current_time = pygame.time.get_ticks()
-        self.stats["time"] = (current_time - self.start_time) // 1000
-
-        #Handle line clear delay
-        if self.line_clear_delay > 0:
-            if current_time - self.line_clear_delay >= FADE_DURATION:
-                self.line_clear_delay = 0
-            return
-
-        #Handle lock delay
-        if self.locked:
-            if current_time - self.lock_delay >= LOCK_DELAY:
-                self.fix_tetromino()
-                self.locked = False
+        if self.state == GameState.PLAYING:
+            self.advance(self.simulate_tick)
+
+    def advance(self, step):
+        #Run as many fixed simulation ticks as the real time since the last frame covers
+        state = self.state
+        now = time.perf_counter()
+        if self.last_frame_time is not None:
+            self.accumulator += min((now - self.last_frame_time) * 1000, MAX_CATCH_UP)
+        self.last_frame_time = now
+        while self.accumulator >= self.tick_ms and self.state == state:
+            self.accumulator -= self.tick_ms
+            step()
+
+    def simulate_tick(self):
+        #One simulation step: queued inputs, held keys and autoplay, then gravity and locking
+        engine = self.engine
+        self.sim_clock.step()
+        apply_inputs(engine, self.pending_inputs, self.auto_shift)
+        if engine.over:
             return
-
-        #Automatic falling
-        if current_time - self.fall_time > self.fall_speed:
-            if not self.move_vertical():
-                self.locked = True
-                self.lock_delay = current_time
-            else:
-                self.fall_time = current_time
-
-        #Check game mode conditions
-        if self.game_mode == "Sprint" and self.lines_cleared >= GAME_MODES["Sprint"]["goal"]:
-            self.game_over()
-        elif self.game_mode == "Ultra" and current_time - self.start_time >= GAME_MODES["Ultra"]["time_limit"]:
-            self.game_over()
+        if self.autoplay:
+            self.autopilot.step(engine)
+        engine.update()
 
     def draw(self):
-        #Clear screen before rendering
-        self.screen.fill(THEMES[self.current_theme]["background"])
+        #Render gameplay, in dirty mode only changed regions are redrawn
+        full = not self.dirty_rendering or self.needs_full_redraw()
+        if full:
+            self.screen.fill(THEMES[self.current_theme]["background"])
         self.game_surface.fill(THEMES[self.current_theme]["background"])
 
         #Render grid and current tetromino if it exists
         if self.state == GameState.PLAYING:
-            self.grid.draw(self.game_surface, self.current_tetromino if self.current_tetromino else None)
-            if self.current_tetromino:
-                self.draw_current_tetromino()
-            self.screen.blit(self.game_surface, (20, 20))
-            self.draw_ui()
+            current_tetromino = self.engine.current_tetromino
+            if current_tetromino and self.grid.follow(current_tetromino, self.grid.get_ghost_position(current_tetromino)[1]):
+                self.board_dirty = True
+            board_rect = self.grid.draw(self.game_surface, current_tetromino if current_tetromino else None)
+            if current_tetromino:
+                board_rect = union_rects([board_rect, self.draw_current_tetromino()])
+            if full or self.board_dirty:
+                self.screen.blit(self.game_surface, self.board_origin)
+                self.dirty_rects.append(self.game_surface.get_rect(topleft=self.board_origin))
+            else:
+                area = union_rects([board_rect, self.last_board_rect])
+                if area.width and area.height:
+                    self.screen.blit(self.game_surface, area.move(self.board_origin), area)
+                    self.dirty_rects.append(area.move(self.board_origin))
+            self.last_board_rect = board_rect
+            self.draw_ui(full)
+
+    def start_versus(self):
+        #Start a local match, boards without key bindings are played by autoplay
+        if self.versus is None:
+            self.versus = Versus(VERSUS_PLAYERS, self.sprites, self.current_theme, self.screen_size, scale=self.scale)
+            self.versus.subscribe(self.on_versus_event)
+        self.versus.start()
+        self.state = GameState.VERSUS
+        self.last_frame_time = None
+
+    def on_versus_event(self, event, *args):
+        #Sounds of every board in a match
+        if event == "hard_drop":
+            self.assets.play("hard_drop")
+        elif event == "clear":
+            self.assets.play("line_clear")
+        elif event == "game_over":
+            self.assets.play("game_over")
+
+    def handle_versus_events(self):
+        #Route keys to the players of a match
+        for event in self.poll_events():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+            if event.type == pygame.KEYDOWN:
+                if self.versus.key_down(event.key):
+                    continue
+                if event.key == pygame.K_ESCAPE:
+                    self.state = GameState.MENU
+                elif event.key == pygame.K_SPACE and self.versus.over:
+                    self.versus.start()
+                elif event.key == pygame.K_F3:
+                    self.toggle_profiler()
+            elif event.type == pygame.KEYUP:
+                self.versus.key_up(event.key)
+            elif event.type == pygame.WINDOWFOCUSLOST:
+                self.versus.release_all()
+
+    def update_versus(self):
+        #Step every board on the shared simulation clock until one is left
+        if self.state == GameState.VERSUS and not self.versus.over:
+            self.advance(self.versus.step)
+
+    def draw_versus(self):
+        #Render all boards of a match in one batch
+        self.screen.fill(THEMES[self.current_theme]["background"])
+        self.versus.draw(self.screen, THEMES[self.current_theme], self.text_cache, self.font, self.show_profiler)
+        if self.versus.over:
+            winner = self.versus.winner
+            self.draw_text(f"{winner.name} wins!" if winner else "Draw", (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20), 24, center=True)
+            self.draw_text("Press SPACE for a rematch or ESC for the menu", (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20), center=True)
 
     def draw_menu(self):
         #Main menu render
@@ -325,7 +544,7 @@ class Game:
         for i, mode in enumerate(self.modes):
             color = (255, 255, 0) if mode == self.selected_mode else THEMES[self.current_theme]["text"]
             self.draw_text(mode, (SCREEN_WIDTH // 2, 250 + i * 40), center=True, color=color)
-        self.draw_text("Press ENTER to start, S for settings, L to load, ESC to quit", (SCREEN_WIDTH // 2, 400), center=True)
+        self.draw_text("Press ENTER to start, A for demo, V for versus, S for settings, L to load, ESC to quit", (SCREEN_WIDTH // 2, 400), center=True)
 
     def draw_settings(self):
         #Settings menu render
@@ -351,215 +570,171 @@ class Game:
         self.screen.fill(THEMES[self.current_theme]["background"])
         self.draw_text("GAME OVER", (SCREEN_WIDTH // 2, 200), 24, center=True)
         self.draw_text(f"Final Score: {self.final_score}", (SCREEN_WIDTH // 2, 250), center=True)
-        self.draw_text(f"High Score: {self.high_score}", (SCREEN_WIDTH // 2, 280), center=True)
-        self.draw_text(f"Time: {self.stats['time']}s", (SCREEN_WIDTH // 2, 310), center=True)
+        self.draw_text(f"High Score: {self.engine.high_score}", (SCREEN_WIDTH // 2, 280), center=True)
+        self.draw_text(f"Time: {self.engine.stats['time']}s", (SCREEN_WIDTH // 2, 310), center=True)
         self.draw_text("Tetrominos:", (SCREEN_WIDTH // 2, 340), center=True)
-        for i, (shape, count) in enumerate(self.stats["tetrominos"].items()):
+        for i, (shape, count) in enumerate(self.engine.stats["tetrominos"].items()):
             self.draw_text(f"{shape}: {count}", (SCREEN_WIDTH // 2, 360 + i * 20), center=True)
         self.draw_text("Lines Cleared:", (SCREEN_WIDTH // 2, 520), center=True)
-        for i, (lines, count) in enumerate(self.stats["lines"].items()):
+        for i, (lines, count) in enumerate(self.engine.stats["lines"].items()):
             self.draw_text(f"{lines} Lines: {count}", (SCREEN_WIDTH // 2, 540 + i * 20), center=True)
         self.draw_text("Press SPACE to restart or ESC to quit", (SCREEN_WIDTH // 2, 620), center=True)
 
-    def draw_ui(self):
-        #UI render
-        self.draw_text(f"Score: {self.score}", (320, 50))
-        self.draw_text(f"High Score: {self.high_score}", (320, 80))
-        self.draw_text(f"Level: {self.level}", (320, 110))
-        self.draw_text(f"Mode: {self.game_mode}", (320, 140))
-        self.draw_text("Next:", (320, 170))
-        self.draw_tetromino_preview(self.next_tetromino, 320, 200)
-        self.draw_text("Hold:", (320, 320))
-        self.draw_tetromino_preview(self.held_tetromino, 320, 350)
+    def draw_ui(self, full=True):
+        #UI render, unless full only items whose value changed are redrawn
+        engine = self.engine
+        next_tetromino, held_tetromino = engine.next_tetromino, engine.held_tetromino
+        hud = self.hud
+        self.draw_hud_item("score", engine.score, full, lambda value: self.draw_number("Score: ", value, hud["score"]))
+        self.draw_hud_item("high_score", engine.high_score, full, lambda value: self.draw_number("High Score: ", value, hud["high_score"]))
+        self.draw_hud_item("level", engine.level, full, lambda value: self.draw_number("Level: ", value, hud["level"]))
+        self.draw_hud_item("mode", f"Mode: {self.game_mode}", full, lambda text: self.draw_text(text, hud["mode"]))
+        self.draw_hud_item("next_label", "Next:", full, lambda text: self.draw_text(text, hud["next_label"]))
+        self.draw_hud_item("next", preview_key(next_tetromino), full, lambda key: self.draw_tetromino_preview(next_tetromino, *hud["next"]))
+        self.draw_hud_item("hold_label", "Hold:", full, lambda text: self.draw_text(text, hud["hold_label"]))
+        self.draw_hud_item("hold", preview_key(held_tetromino), full, lambda key: self.draw_tetromino_preview(held_tetromino, *hud["hold"]))
+        if self.show_profiler:
+            #Refresh the numbers a few times per second so the overlay stays readable and cheap
+            if not self.profiler_lines or self.profiler.frames % 15 == 0:
+                first_frame = self.assets.timings.get("first_frame", 0)
+                self.profiler_lines = self.profiler.summary_lines() + (f"first frame {first_frame:.0f} ms", self.pixel_line())
+                if self.publisher:
+                    self.profiler_lines += self.publisher.summary_lines()
+            self.draw_hud_item("profiler", self.profiler_lines, full, lambda lines: self.draw_profiler(lines, *hud["profiler"]))
+
+    def pixel_line(self):
+        #Mean pixels updated per gameplay frame, and their share of the screen
+        samples = self.pixel_samples
+        mean = sum(samples) / len(samples) if samples else 0
+        return f"pixels {mean:.0f} ({mean * 100 / (self.screen.get_width() * self.screen.get_height()):.1f}%)"
+
+    def draw_profiler(self, lines, x, y):
+        #Render the frame timing overlay, in as many columns as it takes to stay above the bottom margin
+        color = THEMES[self.current_theme]["text"]
+        per_column = max(1, (SCREEN_HEIGHT - BOARD_MARGIN - y) // 16)
+        rects = []
+        for start in range(0, len(lines), per_column):
+            column = [self.draw_text(line, (x, y + i * 16), 14, color=color) for i, line in enumerate(lines[start:start + per_column])]
+            rects += column
+            x += max(rect.width for rect in column) / self.scale + BOARD_MARGIN
+        return union_rects(rects)
+
+    def draw_hud_item(self, key, value, full, draw):
+        #Draw a HUD item, erasing its previous area when only the value changed
+        previous = self.hud_items.get(key)
+        if not full and previous is not None and previous[0] == value:
+            return
+        old_rect = previous[1] if previous is not None else pygame.Rect(0, 0, 0, 0)
+        if not full:
+            self.screen.fill(THEMES[self.current_theme]["background"], old_rect)
+        rect = draw(value)
+        self.hud_items[key] = (value, rect)
+        if not full:
+            self.dirty_rects.append(union_rects([old_rect, rect]))
 
     def draw_tetromino_preview(self, tetromino, x, y):
-        #Render tetromino preview
+        #Render tetromino preview at a layout position
         if not tetromino:
-            return
+            return pygame.Rect(0, 0, 0, 0)
+        rects = []
+        x, y = self.point((x, y))
+        step = self.px(PREVIEW_CELL)
+        cell_surface = self.sprites.get(tetromino.color, THEMES[self.current_theme]["cell_alpha"], step - 2, 1)
         for dy, row in enumerate(tetromino.shape):
             for dx, cell in enumerate(row):
                 if cell:
-                    cell_surface = pygame.Surface((18, 18), pygame.SRCALPHA)
-                    cell_surface.set_alpha(THEMES[self.current_theme]["cell_alpha"])
-                    cell_surface.fill((*tetromino.color, THEMES[self.current_theme]["cell_alpha"]))
-                    border_color = tuple(min(255, c + 40) for c in tetromino.color)
-                    pygame.draw.rect(cell_surface, (*border_color, THEMES[self.current_theme]["cell_alpha"]), (0, 0, 18, 18), 1)
-                    self.screen.blit(cell_surface, (x + dx * 20, y + dy * 20))
+                    rects.append(self.screen.blit(cell_surface, (x + dx * step, y + dy * step)))
+        return union_rects(rects)
 
     def draw_current_tetromino(self):
         #Render current tetromino
-        if not self.current_tetromino:
-            return
-        for y, row in enumerate(self.current_tetromino.shape):
+        current_tetromino = self.engine.current_tetromino
+        if not current_tetromino:
+            return pygame.Rect(0, 0, 0, 0)
+        rects = []
+        grid = self.grid
+        cell_size = grid.cell_size
+        for y, row in enumerate(current_tetromino.shape):
             for x, cell in enumerate(row):
-                if cell:
-                    screen_x = (self.current_tetromino.x + x) * CELL_SIZE
-                    screen_y = (self.current_tetromino.y + y) * CELL_SIZE
-                    cell_surface = pygame.Surface((CELL_SIZE - 2, CELL_SIZE - 2), pygame.SRCALPHA)
-                    cell_surface.set_alpha(THEMES[self.current_theme]["cell_alpha"])
-                    cell_surface.fill((*self.current_tetromino.color, THEMES[self.current_theme]["cell_alpha"]))
-                    border_color = tuple(min(255, c + 40) for c in self.current_tetromino.color)
-                    pygame.draw.rect(cell_surface, (*border_color, THEMES[self.current_theme]["cell_alpha"]), (0, 0, CELL_SIZE - 2, CELL_SIZE - 2), 2)
-                    self.game_surface.blit(cell_surface, (screen_x, screen_y))
+                if cell and grid.in_view(current_tetromino.x + x, current_tetromino.y + y):
+                    screen_x = (current_tetromino.x + x - grid.view_left) * cell_size
+                    screen_y = (current_tetromino.y + y - grid.view_top) * cell_size
+                    cell_surface = self.sprites.get(current_tetromino.color, THEMES[self.current_theme]["cell_alpha"], cell_size - 2, 2)
+                    rects.append(self.game_surface.blit(cell_surface, (screen_x, screen_y)))
+        return union_rects(rects)
 
     def draw_text(self, text, position, size=18, color=None, center=False):
-        #Render in-game text
+        #Render in-game text at a layout position
         if color is None:
             color = THEMES[self.current_theme]["text"]
-        font = self.menu_font if size > 18 else self.font
-        text_surface = font.render(text, True, color)
+        font = self.menu_font if size > 18 else self.small_font if size < 18 else self.font
+        text_surface = self.text_cache.render(font, text, color)
+        position = self.point(position)
         text_rect = text_surface.get_rect(center=position) if center else text_surface.get_rect(topleft=position)
-        self.screen.blit(text_surface, text_rect)
+        return self.screen.blit(text_surface, text_rect)
+
+    def draw_number(self, label, value, position, color=None):
+        #Render a cached label followed by a number composed from cached digit glyphs
+        if color is None:
+            color = THEMES[self.current_theme]["text"]
+        label_rect = self.draw_text(label, position, color=color)
+        atlas = self.glyph_atlases.get((self.font, color))
+        if atlas is None:
+            atlas = GlyphAtlas(self.font, color)
+            self.glyph_atlases[(self.font, color)] = atlas
+        number_rect = atlas.draw(self.screen, str(value), label_rect.topright)
+        return union_rects([label_rect, number_rect])
 
     def start_game(self):
         #Launch game
         self.state = GameState.PLAYING
         self.game_mode = self.selected_mode
-        self.fall_speed = GAME_MODES[self.game_mode]["fall_speed"]
-        self.current_tetromino = self.bag.get_next()
-        self.next_tetromino = self.bag.get_next()
-        self.held_tetromino = None
-        self.can_hold = True
-        self.start_time = pygame.time.get_ticks()
-        self.stats = {
-            "tetrominos": {'I': 0, 'O': 0, 'T': 0, 'L': 0, 'J': 0, 'S': 0, 'Z': 0},
-            "lines": {1: 0, 2: 0, 3: 0, 4: 0},
-            "time": 0
-        }
+        self.pending_inputs.clear()
+        self.auto_shift.release_all()
+        self.engine.start(self.game_mode)
         self.screen.fill(THEMES[self.current_theme]["background"])
         pygame.display.flip()
 
-    def move_horizontal(self, direction):
-        #Move tetromino horizontaly
-        new_x = self.current_tetromino.x + direction
-        if self.grid.is_valid_position(self.current_tetromino, new_x, self.current_tetromino.y):
-            self.current_tetromino.x = new_x
-            self.locked = False
-
-    def rotate_tetromino(self, clockwise=True):
-        #Tetromino rotation
-        self.sounds["rotate"].play()
-        success = (self.current_tetromino.rotate_clockwise(self.grid) if clockwise
-                   else self.current_tetromino.rotate_counterclockwise(self.grid))
-        if success and self.locked:
-            self.locked = False
-        if not success:
-            self.sounds["rotate"].stop()
-
-    def soft_drop(self):
-        #Preform soft drop
-        if self.move_vertical():
-            self.score += 1 * self.level
-            self.fall_time = pygame.time.get_ticks()
-            self.sounds["drop"].play()
-            self.locked = False
-
-    def hard_drop(self):
-        #Perform hard drop
-        self.sounds["hard_drop"].play()
-        drop_distance = 0
-        while self.move_vertical():
-            drop_distance += 1
-        self.score += 2 * drop_distance * self.level
-        self.fix_tetromino()
-
-    def hold_tetromino(self):
-        #Hold tetromino in place
-        if not self.can_hold:
-            return
-        self.sounds["rotate"].play()
-        if self.held_tetromino is None:
-            self.held_tetromino = self.current_tetromino
-            self.current_tetromino = self.bag.get_next()
-        else:
-            self.held_tetromino, self.current_tetromino = self.current_tetromino, self.held_tetromino
-            self.current_tetromino.x = 3
-            self.current_tetromino.y = 0
-            self.current_tetromino.rotation = 0
-            self.current_tetromino.shape = self.current_tetromino._get_shape_matrix(self.current_tetromino.shape_type)
-        self.can_hold = False
-        self.locked = False
-
-    def move_vertical(self):
-        #Move tetromino down
-        new_y = self.current_tetromino.y + 1
-        if self.grid.is_valid_position(self.current_tetromino, self.current_tetromino.x, new_y):
-            self.current_tetromino.y = new_y
-            return True
-        return False
-
-    def fix_tetromino(self):
-        #Lock tetromino and handle line clears
-        self.sounds["drop"].play()
-        self.stats["tetrominos"][self.current_tetromino.shape_type] += 1
-        for y, row in enumerate(self.current_tetromino.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    grid_y = self.current_tetromino.y + y
-                    grid_x = self.current_tetromino.x + x
-                    if grid_y < 0:
-                        self.game_over()
-                        return
-                    self.grid.cells[grid_y][grid_x] = self.current_tetromino.color
-
-        lines_cleared = self.grid.clear_lines()
-        if lines_cleared > 0:
-            self.update_score(lines_cleared)
-            self.line_clear_delay = pygame.time.get_ticks()
-            self.stats["lines"][lines_cleared] += 1
-
-        self.current_tetromino = self.next_tetromino
-        self.next_tetromino = self.bag.get_next()
-        self.can_hold = True
-        self.locked = False
-
-        if not self.grid.is_valid_position(self.current_tetromino, self.current_tetromino.x, self.current_tetromino.y):
-            self.game_over()
-
-    def update_score(self, lines):
-        #Update score and level
-        self.score += SCORE_DATA.get(lines, 0) * self.level
-        self.lines_cleared += lines
-        new_level = 1 + self.lines_cleared // LINES_PER_LEVEL
-        if new_level > self.level:
-            self.level = new_level
-            self.fall_speed = max(50, 1000 - (self.level * LEVEL_SPEED_REDUCTION))
-        if lines > 0:
-            self.sounds["line_clear"].play()
-        if self.score > self.high_score:
-            self.high_score = self.score
-            self.save_high_score()
-
-    def game_over(self):
-        #Trigger game over
-        self.sounds["game_over"].play()
-        self.state = GameState.GAME_OVER
-        self.final_score = self.score
-        if self.score > self.high_score:
-            self.high_score = self.score
+    def on_engine_event(self, event, *args):
+        #Play sounds and switch state on engine events
+        if event == "start":
+            #Nothing on screen belongs to the new game, dirty rendering starts from a full frame
+            self.full_redraw = True
+        elif event in ("rotate", "hold"):
+            self.assets.play("rotate")
+        elif event == "soft_drop":
+            self.assets.play("drop")
+        elif event == "lock":
+            self.assets.play("drop")
+            self.board_dirty = True
+        elif event == "hard_drop":
+            self.assets.play("hard_drop")
+        elif event == "clear":
+            self.assets.play("line_clear")
+        elif event == "high_score":
             self.save_high_score()
+        elif event == "game_over":
+            self.assets.play("game_over")
+            self.state = GameState.GAME_OVER
+            self.final_score = self.engine.score
+            self.save_replay()
+
+    def save_replay(self):
+        #Save the replay of the finished game
+        replay = self.recorder.stop()
+        if not RECORD_REPLAYS or replay is None:
+            return
+        try:
+            replay.save(default_replay_path(PATHS["replays"], replay.game_mode))
+        except Exception as e:
+            logging.error(f"Failed to save replay: {e}")
 
     def reset(self):
         #Reset game state
         self.state = GameState.PLAYING
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = GAME_MODES[self.game_mode]["fall_speed"]
-        self.grid.reset()
-        self.bag = TetrominoBag()
-        self.current_tetromino = self.bag.get_next()
-        self.next_tetromino = self.bag.get_next()
-        self.held_tetromino = None
-        self.can_hold = True
-        self.line_clear_delay = 0
-        self.locked = False
-        self.start_time = pygame.time.get_ticks()
-        self.stats = {
-            "tetrominos": {'I': 0, 'O': 0, 'T': 0, 'L': 0, 'J': 0, 'S': 0, 'Z': 0},
-            "lines": {1: 0, 2: 0, 3: 0, 4: 0},
-            "time": 0
-        }
+        self.pending_inputs.clear()
+        self.auto_shift.release_all()
+        self.engine.start(self.game_mode)
 
     def load_high_score(self):
         #Load high score
@@ -572,31 +747,31 @@ class Game:
         return 0
 
     def save_high_score(self):
-        #Save high score
-        try:
-            with open("high_score.txt", "w") as f:
-                f.write(str(self.high_score))
-        except Exception as e:
-            logging.error(f"Failed to save high score: {e}")
+        #Queue the high score, repeated updates within PERSIST_INTERVAL are written once
+        self.storage.submit("high_score.txt", write_text, str(self.engine.high_score))
 
     def save_game(self):
-        #Save game state
+        #Snapshot the game state, encoding and writing happen on a background thread
         try:
-            save_data = SaveGame.save(self)
-            with open("save_game.json", "w") as f:
-                json.dump(save_data, f)
+            save_data = SaveGame.save(self.engine)
+            self.storage.submit("save_game.sav", SaveGame.write, save_data)
+            self.storage.flush(wait=False)
         except Exception as e:
             logging.error(f"Failed to save game: {e}")
 
     def load_game(self):
-        #Load save file
-        if os.path.exists("save_game.json"):
+        #Load save file, falling back to a save from the old JSON format
+        self.storage.flush()
+        path = next((path for path in ("save_game.sav", "save_game.json") if os.path.exists(path)), None)
+        if path is not None:
             try:
-                with open("save_game.json", "r") as f:
-                    save_data = json.load(f)
-                SaveGame.load(self, save_data)
+                save_data = SaveGame.read(path)
+                SaveGame.load(self.engine, save_data)
+                self.recorder.stop()
+                if self.publisher:
+                    self.publisher.request_keyframe()
+                self.game_mode = self.engine.game_mode
                 self.state = GameState.PLAYING
-                self.start_time = pygame.time.get_ticks() - (self.stats["time"] * 1000)
             except Exception as e:
                 logging.error(f"Failed to load game: {e}")
                 print("Failed to load game. Starting a new one.")
@@ -1,66 +1,144 @@
 import pygame
-from config import THEMES, CELL_SIZE, FADE_DURATION
-
-class Grid:
-    def __init__(self):
-        #Initialize game grid
-        self.rows = 20
-        self.cols = 10
-        self.cell_size = CELL_SIZE
-        self.cells = [[0 for _ in range(self.cols)] for _ in range(self.rows)]
-        self.cleared_lines = []
+from config import THEMES, CELL_SIZE, FADE_DURATION, GRID_ROWS, GRID_COLS, VIEWPORT_ROWS, VIEWPORT_COLS, VIEWPORT_MARGIN
+from .board import Board
+from .sprites import SpriteCache
+
+def union_rects(rects):
+    #Union of non-empty rects, an empty rect if there are none
+    rects = [rect for rect in rects if rect.width and rect.height]
+    return rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+
+def follow_axis(start, low, high, size, total, margin):
+    #View start along one axis keeping low..high margin cells inside the view, low wins if both do not fit
+    if high + margin >= start + size:
+        start = high + margin - size + 1
+    if low - margin < start:
+        start = low - margin
+    return max(0, min(start, total - size))
+
+class Grid(Board):
+    def __init__(self, sprites=None, rows=GRID_ROWS, cols=GRID_COLS, cell_size=CELL_SIZE):
+        #Initialize game grid, only a viewport of it is rendered and the camera follows the active piece
+        super().__init__(rows, cols)
+        self.cell_size = cell_size
+        self.sprites = sprites if sprites is not None else SpriteCache()
         self.clear_start_time = 0
-        self.grid_lines_surface = pygame.Surface((self.cols * self.cell_size, self.rows * self.cell_size), pygame.SRCALPHA)
+        self.view_rows = min(rows, VIEWPORT_ROWS)
+        self.view_cols = min(cols, VIEWPORT_COLS)
+        self.view_top = 0
+        self.view_left = (cols - self.view_cols) // 2
+        self.create_layers()
         self.current_theme = "Classic"
         self.update_theme()
 
+    def create_layers(self):
+        #Viewport sized layers at the current cell size
+        size = (self.view_cols * self.cell_size, self.view_rows * self.cell_size)
+        self.grid_lines_surface = pygame.Surface(size, pygame.SRCALPHA)
+        #Grid lines plus locked cells in view, patched incrementally as pieces lock and lines clear
+        self.stack_surface = pygame.Surface(size, pygame.SRCALPHA)
+
+    def set_cell_size(self, cell_size):
+        #Redraw the layers at a new cell size, called when the output resolution changes
+        if cell_size == self.cell_size:
+            return
+        self.cell_size = cell_size
+        self.create_layers()
+        self.update_theme()
+
     def update_theme(self):
         #Update grid lines with current theme
+        self.sprites.clear()
         self.grid_lines_surface.fill((0, 0, 0, 0))
         self.draw_grid_lines_to_surface()
+        self.rebuild_stack()
 
-    def is_valid_position(self, tetromino, offset_x, offset_y):
-        #Check if tetromino can be placed
-        for y, row in enumerate(tetromino.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    grid_x = offset_x + x
-                    grid_y = offset_y + y
-                    if grid_x < 0 or grid_x >= self.cols or grid_y >= self.rows:
-                        return False
-                    if grid_y >= 0 and self.cells[grid_y][grid_x] != 0:
-                        return False
+    def rebuild_stack(self):
+        #Redraw the locked stack layer for the rows in view
+        self.stack_surface.fill((0, 0, 0, 0))
+        self.stack_surface.blit(self.grid_lines_surface, (0, 0))
+        self.draw_stack_rows(self.view_top, self.view_top + self.view_rows)
+
+    def draw_stack_rows(self, start, end):
+        #Draw the locked cells of board rows start..end-1 that are in view
+        alpha = THEMES[self.current_theme]["cell_alpha"]
+        left = self.view_left
+        view_mask = (1 << self.view_cols) - 1
+        for y in range(max(start, self.view_top), min(end, self.view_top + self.view_rows)):
+            if not (self.bits[y] >> left) & view_mask:
+                continue
+            row = self.cells[y]
+            for x in range(left, left + self.view_cols):
+                if row[x] != 0:
+                    self.draw_cell(self.stack_surface, x, y, row[x], alpha)
+
+    def in_view(self, x, y):
+        return self.view_left <= x < self.view_left + self.view_cols and self.view_top <= y < self.view_top + self.view_rows
+
+    def follow(self, tetromino, ghost_y=None):
+        #Move the camera so the tetromino, and its landing spot if there is room, stay in view.
+        #The stack layer is redrawn when the camera moves, True if it did
+        if tetromino is None or (self.view_rows == self.rows and self.view_cols == self.cols):
+            return False
+        min_x, max_x, min_y, max_y = tetromino.orientation.bounding_box
+        bottom = (ghost_y if ghost_y is not None else tetromino.y) + max_y
+        top = follow_axis(self.view_top, tetromino.y + min_y, bottom, self.view_rows, self.rows, VIEWPORT_MARGIN)
+        left = follow_axis(self.view_left, tetromino.x + min_x, tetromino.x + max_x, self.view_cols, self.cols, VIEWPORT_MARGIN)
+        if (top, left) == (self.view_top, self.view_left):
+            return False
+        self.view_top, self.view_left = top, left
+        self.rebuild_stack()
         return True
 
-    def clear_lines(self):
-        #Clear completed lines
-        lines_to_clear = [idx for idx, row in enumerate(self.cells) if all(cell != 0 for cell in row)]
-        if lines_to_clear:
-            self.cleared_lines = [(idx, self.cells[idx][:]) for idx in lines_to_clear]
+    def place(self, tetromino):
+        #Lock tetromino and patch its cells into the stack layer
+        if not super().place(tetromino):
+            return False
+        alpha = THEMES[self.current_theme]["cell_alpha"]
+        for x, y in tetromino.orientation.cells:
+            self.draw_cell(self.stack_surface, tetromino.x + x, tetromino.y + y, tetromino.color, alpha)
+        return True
+
+    def clear_lines(self, rows=None):
+        #Clear completed lines, scroll the stack layer and start the fade effect
+        lines = super().clear_lines(rows)
+        if lines:
             self.clear_start_time = pygame.time.get_ticks()
-            for idx in reversed(lines_to_clear):
-                del self.cells[idx]
-            for _ in range(len(lines_to_clear)):
-                self.cells.insert(0, [0] * self.cols)
-        return len(lines_to_clear)
-
-    def get_ghost_position(self, tetromino):
-        #Calculate ghost tetromino position
-        x, y = tetromino.x, tetromino.y
-        while self.is_valid_position(tetromino, x, y + 1):
-            y += 1
-        return x, y
+            width = self.view_cols * self.cell_size
+            shifted = 0
+            for idx, _ in self.cleared_lines:
+                #Rows above a cleared row move down by one, clears above the view leave it unchanged
+                view_y = min(idx - self.view_top, self.view_rows - 1)
+                if view_y < 0:
+                    continue
+                self.stack_surface.set_clip(pygame.Rect(0, 0, width, (view_y + 1) * self.cell_size))
+                self.stack_surface.scroll(0, self.cell_size)
+                self.stack_surface.set_clip(None)
+                shifted += 1
+            #Rows scrolled in at the top of the view come from above it, or are empty
+            shifted = min(shifted, self.view_rows)
+            if shifted:
+                top_rows = pygame.Rect(0, 0, width, shifted * self.cell_size)
+                self.stack_surface.fill((0, 0, 0, 0), top_rows)
+                self.stack_surface.blit(self.grid_lines_surface, top_rows, top_rows)
+                self.draw_stack_rows(self.view_top, self.view_top + shifted)
+        return lines
+
+    def add_garbage(self, count, hole, color):
+        #Push garbage rows into the board and redraw the stack layer
+        result = super().add_garbage(count, hole, color)
+        self.rebuild_stack()
+        return result
+
+    def set_cells(self, cells):
+        #Replace board contents and redraw the stack layer
+        super().set_cells(cells)
+        self.rebuild_stack()
 
     def draw(self, screen, ghost_tetromino=None):
-        #Draw grid
+        #Draw grid, returns the area covered by ghost and fade effect
         rects = []
-        screen.blit(self.grid_lines_surface, (0, 0))
-        for y in range(self.rows):
-            for x in range(self.cols):
-                if self.cells[y][x] != 0:
-                    rect = self.draw_cell(screen, x, y, self.cells[y][x], THEMES[self.current_theme]["cell_alpha"])
-                    if isinstance(rect, pygame.Rect):
-                        rects.append(rect)
+        screen.blit(self.stack_surface, (0, 0))
         if ghost_tetromino:
             ghost_x, ghost_y = self.get_ghost_position(ghost_tetromino)
             rect = self.draw_ghost_tetromino(screen, ghost_tetromino, ghost_x, ghost_y)
@@ -70,32 +148,37 @@ class Grid:
             rect = self.draw_fade_effect(screen)
             if isinstance(rect, pygame.Rect):
                 rects.append(rect)
-        return pygame.Rect.unionall(pygame.Rect(0, 0, 0, 0), rects) if rects else pygame.Rect(0, 0, 0, 0)
+        return union_rects(rects)
 
     def draw_grid_lines_to_surface(self):
         #Draw grid lines
         line_color = THEMES[self.current_theme]["grid_line"]
-        for x in range(self.cols + 1):
+        for x in range(self.view_cols + 1):
             start_pos = (x * self.cell_size, 0)
-            end_pos = (x * self.cell_size, self.rows * self.cell_size)
+            end_pos = (x * self.cell_size, self.view_rows * self.cell_size)
             pygame.draw.line(self.grid_lines_surface, line_color, start_pos, end_pos)
-        for y in range(self.rows + 1):
+        for y in range(self.view_rows + 1):
             start_pos = (0, y * self.cell_size)
-            end_pos = (self.cols * self.cell_size, y * self.cell_size)
+            end_pos = (self.view_cols * self.cell_size, y * self.cell_size)
             pygame.draw.line(self.grid_lines_surface, line_color, start_pos, end_pos)
 
     def draw_cell(self, screen, x, y, color, alpha=255):
-        #Draw a cell
-        cell_surface = pygame.Surface((self.cell_size - 1, self.cell_size - 1), pygame.SRCALPHA)
-        cell_surface.set_alpha(alpha)
-        cell_surface.fill((*color, alpha))
-
-        border_color = tuple(min(255, c + 40) for c in color)
-        pygame.draw.rect(cell_surface, (*border_color, alpha), (0, 0, self.cell_size - 1, self.cell_size - 1), 2)
-        rect = pygame.Rect(x * self.cell_size, y * self.cell_size, self.cell_size - 1, self.cell_size - 1)
+        #Draw a cell at board coordinates, cells outside the viewport are skipped
+        if not self.in_view(x, y):
+            return pygame.Rect(0, 0, 0, 0)
+        cell_surface = self.sprites.get(color, alpha, self.cell_size - 1, 2)
+        rect = pygame.Rect((x - self.view_left) * self.cell_size, (y - self.view_top) * self.cell_size, self.cell_size - 1, self.cell_size - 1)
         screen.blit(cell_surface, rect)
         return rect
 
+    def cell_blits(self, cells, x, y, color, alpha, origin):
+        #(sprite, position) pairs for Surface.blits of cells offset by x, y, culled to the viewport,
+        #origin is where the viewport's top left corner lands on the target surface
+        sprite = self.sprites.get(color, alpha, self.cell_size - 1, 2)
+        left, top = origin
+        return [(sprite, (left + (x + dx - self.view_left) * self.cell_size, top + (y + dy - self.view_top) * self.cell_size))
+                for dx, dy in cells if self.in_view(x + dx, y + dy)]
+
     def draw_ghost_tetromino(self, screen, tetromino, offset_x, offset_y):
         #Draw ghost tetromino
         rects = []
@@ -105,7 +188,7 @@ class Grid:
                     rect = self.draw_cell(screen, offset_x + x, offset_y + y, tetromino.color, THEMES[self.current_theme]["ghost_alpha"])
                     if isinstance(rect, pygame.Rect):
                         rects.append(rect)
-        return pygame.Rect.unionall(pygame.Rect(0, 0, 0, 0), rects) if rects else pygame.Rect(0, 0, 0, 0)
+        return union_rects(rects)
 
     def draw_fade_effect(self, screen):
         #Draw fade effect for cleared lines
@@ -114,17 +197,23 @@ class Grid:
         if fade_progress >= 1:
             self.cleared_lines = []
             return pygame.Rect(0, 0, 0, 0)
-        alpha = int((1 - fade_progress) * 255)
+        #Quantize alpha so the fade reuses a handful of cached sprites
+        alpha = int((1 - fade_progress) * 17) * 15
         rects = []
         for y, colors in self.cleared_lines:
-            for x, color in enumerate(colors):
+            if not self.view_top <= y < self.view_top + self.view_rows:
+                continue
+            for x in range(self.view_left, self.view_left + self.view_cols):
+                color = colors[x]
                 if color != 0:
                     rect = self.draw_cell(screen, x, y, color, alpha)
                     if isinstance(rect, pygame.Rect):
                         rects.append(rect)
-        return pygame.Rect.unionall(pygame.Rect(0, 0, 0, 0), rects) if rects else pygame.Rect(0, 0, 0, 0)
+        return union_rects(rects)
 
     def reset(self):
-        #Reset grid
-        self.cells = [[0 for _ in range(self.cols)] for _ in range(self.rows)]
-        self.cleared_lines = []
\ No newline at end of file
+        #Reset grid, camera and the stack layer
+        super().reset()
+        self.view_top = 0
+        self.view_left = (self.cols - self.view_cols) // 2
+        self.rebuild_stack()
@@ -0,0 +1,93 @@
+import logging
+import pygame
+
+#Actions that repeat while their key is held
+REPEATING = ("left", "right", "down")
+
+def apply_inputs(engine, pending_inputs, auto_shift):
+    #Apply queued (pressed, action) inputs, then held key repeats that are due. Events carry no
+    #timestamps, so presses polled in a frame all land on the first tick of that frame's batch:
+    #presses have frame resolution, only the repeats are timed to the simulation tick
+    now = engine.clock()
+    while pending_inputs and not engine.over:
+        pressed, action = pending_inputs.popleft()
+        if not pressed:
+            auto_shift.release(action, now)
+            continue
+        if action in REPEATING:
+            auto_shift.press(action, now)
+        engine.apply(action)
+    for action, count in auto_shift.repeats(now):
+        if engine.over:
+            break
+        if count is None:
+            while engine.apply(action):
+                pass
+        else:
+            for _ in range(count):
+                engine.apply(action)
+
+class InputMap:
+    #Keycode to action table compiled from key bindings, rebuilt only when a key is rebound.
+    #A dict rather than an array because SDL2 keycodes are sparse, non-character keys have bit 30 set
+    def __init__(self, key_bindings):
+        self.actions = {}
+        self.compile(key_bindings)
+
+    def compile(self, key_bindings):
+        actions = {}
+        for action, key_name in key_bindings.items():
+            try:
+                actions[pygame.key.key_code(key_name)] = action
+            except ValueError:
+                logging.error(f"Unknown key {key_name!r} bound to {action}")
+        self.actions = actions
+
+    def get(self, keycode):
+        return self.actions.get(keycode)
+
+class AutoShift:
+    #Delayed auto shift and auto repeat with a timer per direction, in engine clock ms.
+    #A press moves once, holding left or right for das starts repeats every arr and
+    #holding down repeats every soft_drop_arr. A rate of 0 repeats as far as the piece goes.
+    #Of left and right only the last pressed one repeats, releasing it hands over to the
+    #other if that is still held, which then charges its delay again.
+    def __init__(self, das, arr, soft_drop_arr):
+        self.delays = {"left": das, "right": das, "down": soft_drop_arr}
+        self.rates = {"left": arr, "right": arr, "down": soft_drop_arr}
+        self.timers = dict.fromkeys(REPEATING)
+        self.horizontal = None
+
+    def press(self, action, now):
+        self.timers[action] = now + self.delays[action]
+        if action != "down":
+            self.horizontal = action
+
+    def release(self, action, now):
+        self.timers[action] = None
+        if action == self.horizontal:
+            other = "right" if action == "left" else "left"
+            self.horizontal = None
+            if self.timers[other] is not None:
+                self.press(other, now)
+
+    def release_all(self):
+        self.timers = dict.fromkeys(REPEATING)
+        self.horizontal = None
+
+    def repeats(self, now):
+        #(action, count) pairs due by now, a count of None repeats until the move fails
+        due = []
+        for action in (self.horizontal, "down"):
+            timer = self.timers.get(action)
+            if timer is None or timer > now:
+                continue
+            rate = self.rates[action]
+            if rate == 0:
+                due.append((action, None))
+                self.timers[action] = now + 1
+            else:
+                count = (now - timer) // rate + 1
+                due.append((action, count))
+                self.timers[action] = timer + count * rate
+        return due
@@ -0,0 +1,97 @@
+import atexit
+import csv
+import time
+from collections import deque
+
+#Frame phases in the order Game.run executes them
+PHASES = ("tick", "events", "update", "draw", "present")
+
+def percentile(sorted_samples, fraction):
+    #Nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+class FrameProfiler:
+    #Per-phase frame timings with rolling percentiles and missed deadline counts.
+    #A deadline is missed when the frame's work, everything except the tick wait,
+    #takes longer than the frame budget. Idle frames, outside of gameplay, only count
+    #towards the CPU time used per wall clock time while idle.
+    def __init__(self, budget_ms, window=240, csv_path=None):
+        self.budget_ms = budget_ms
+        self.samples = {phase: deque(maxlen=window) for phase in PHASES + ("work",)}
+        self.idle_samples = deque(maxlen=window)
+        self.frames = 0
+        self.missed = 0
+        self.frame = {}
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path:
+            self.open_csv(csv_path)
+
+    def open_csv(self, path):
+        #Start writing one row per frame to path
+        self.close_csv()
+        self.csv_file = open(path, "w", newline="")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(("frame", "state") + PHASES + ("work", "cpu", "missed", "idle"))
+        atexit.register(self.close_csv)
+
+    def close_csv(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+    def begin_frame(self):
+        self.frame = dict.fromkeys(PHASES, 0.0)
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def mark(self, phase):
+        #Charge the time since the previous mark to phase
+        now = time.perf_counter()
+        self.frame[phase] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def end_frame(self, state="", idle=False):
+        #Record the finished frame
+        wall = (time.perf_counter() - self.frame_start) * 1000
+        cpu = (time.process_time() - self.cpu_start) * 1000
+        work = sum(self.frame[phase] for phase in PHASES if phase != "tick")
+        missed = not idle and work > self.budget_ms
+        if idle:
+            self.idle_samples.append((wall, cpu))
+        else:
+            self.frames += 1
+            self.missed += missed
+            for phase in PHASES:
+                self.samples[phase].append(self.frame[phase])
+            self.samples["work"].append(work)
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.frames, state] + [f"{self.frame[phase]:.3f}" for phase in PHASES]
+                                     + [f"{work:.3f}", f"{cpu:.3f}", int(missed), int(idle)])
+
+    def idle_usage(self):
+        #Fraction of one core used over the recent idle frames
+        wall = sum(sample[0] for sample in self.idle_samples)
+        cpu = sum(sample[1] for sample in self.idle_samples)
+        return cpu / wall if wall else 0.0
+
+    def percentiles(self, phase):
+        #Rolling (p50, p95, p99) of a phase in milliseconds
+        samples = sorted(self.samples[phase])
+        return percentile(samples, 0.50), percentile(samples, 0.95), percentile(samples, 0.99)
+
+    def summary_lines(self):
+        #Text lines for the on-screen overlay
+        lines = ["ms     p50   p95   p99"]
+        for phase in PHASES + ("work",):
+            p50, p95, p99 = self.percentiles(phase)
+            lines.append(f"{phase:<7}{p50:5.1f} {p95:5.1f} {p99:5.1f}")
+        lines.append(f"missed {self.missed}/{self.frames}")
+        lines.append(f"idle cpu {self.idle_usage() * 100:.1f}%")
+        return tuple(lines)
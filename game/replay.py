@@ -0,0 +1,149 @@
+import os
+import struct
+import time
+import zlib
+from .engine import Engine, FixedStepClock
+
+#Replay file layout: header, mode name, then zlib-compressed (varint tick delta, action code) records
+MAGIC = b"TRPL"
+VERSION = 2
+HEADER = struct.Struct("<4sBIqqIHIH")
+
+#Action codes, 0 was the engine tick of version 1 replays and stays reserved
+ACTIONS = ("tick", "left", "right", "down", "sonic_drop", "hard_drop", "rotate_cw", "rotate_ccw", "hold")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+class Replay:
+    #A recorded game: mode, seed, start and inputs. start is the simulation tick the game
+    #started on and events are (tick, input) pairs, the game ends after ticks ticks at tick_rate
+    def __init__(self, game_mode, seed, start_time, tick_rate, events=None, final_score=0, lines_cleared=0, ticks=0):
+        self.game_mode = game_mode
+        self.seed = seed
+        self.start_time = start_time
+        self.events = events if events is not None else []
+        self.final_score = final_score
+        self.lines_cleared = lines_cleared
+        self.tick_rate = tick_rate
+        self.ticks = ticks
+
+    def to_bytes(self):
+        records = bytearray()
+        last_time = 0
+        for timestamp, action in self.events:
+            write_varint(records, timestamp - last_time)
+            records.append(ACTION_CODES[action])
+            last_time = timestamp
+        mode = self.game_mode.encode("utf-8")
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.start_time, self.final_score, self.lines_cleared,
+                             self.tick_rate, self.ticks, len(mode))
+        return header + mode + zlib.compress(bytes(records), 9)
+
+    @staticmethod
+    def from_bytes(data):
+        if data[:4] != MAGIC or data[4] != VERSION:
+            raise ValueError("Not a supported replay file")
+        (magic, version, seed, start_time, final_score, lines_cleared,
+         tick_rate, ticks, mode_length) = HEADER.unpack_from(data)
+        offset = HEADER.size
+        game_mode = data[offset:offset + mode_length].decode("utf-8")
+        records = zlib.decompress(data[offset + mode_length:])
+        events = []
+        timestamp = 0
+        position = 0
+        while position < len(records):
+            delta, position = read_varint(records, position)
+            timestamp += delta
+            events.append((timestamp, ACTIONS[records[position]]))
+            position += 1
+        return Replay(game_mode, seed, start_time, tick_rate, events, final_score, lines_cleared, ticks)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return Replay.from_bytes(f.read())
+
+class ReplayRecorder:
+    #Engine listener recording every input with the simulation tick it happened on.
+    #The engine must run on a FixedStepClock, stepped once before each tick's inputs and update
+    def __init__(self, engine):
+        self.engine = engine
+        self.replay = None
+        engine.subscribe(self.on_engine_event)
+
+    def on_engine_event(self, event, *args):
+        clock = self.engine.clock
+        if event == "start":
+            self.replay = Replay(args[0], args[1], clock.ticks, clock.hz)
+        elif self.replay is None:
+            return
+        elif event == "input":
+            self.replay.events.append((clock.ticks - self.replay.start_time, args[0]))
+        elif event == "game_over":
+            self.replay.final_score = self.engine.score
+            self.replay.lines_cleared = self.engine.lines_cleared
+            self.replay.ticks = clock.ticks - self.replay.start_time
+
+    def stop(self):
+        #Stop recording, returns the replay recorded so far
+        replay, self.replay = self.replay, None
+        return replay
+
+def play(replay, engine=None):
+    #Re-run a replay headless as fast as possible, returns the engine
+    engine = engine if engine is not None else Engine()
+    clock = FixedStepClock(replay.tick_rate, replay.start_time)
+    engine.clock = clock
+    engine.start(replay.game_mode, replay.seed)
+    events = replay.events
+    index = 0
+    for tick in range(1, replay.ticks + 1):
+        clock.step()
+        while index < len(events) and events[index][0] == tick:
+            if not engine.over:
+                engine.apply(events[index][1])
+            index += 1
+        engine.update()
+    return engine
+
+def verify(replay):
+    #Play a replay and check it reproduces the recorded result
+    engine = play(replay)
+    return engine.score == replay.final_score and engine.lines_cleared == replay.lines_cleared
+
+def default_replay_path(directory, game_mode):
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{game_mode.lower()}.trpl")
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        replay = Replay.load(path)
+        started = time.perf_counter()
+        engine = play(replay)
+        elapsed = time.perf_counter() - started
+        status = "OK" if engine.score == replay.final_score and engine.lines_cleared == replay.lines_cleared else "MISMATCH"
+        print(f"{path}: {replay.game_mode} seed={replay.seed} score={engine.score} lines={engine.lines_cleared} "
+              f"recorded score={replay.final_score} {status} in {elapsed * 1000:.1f} ms")
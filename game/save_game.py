@@ -1,35 +1,177 @@
 import json
-from .tetromino import Tetromino, TetrominoBag
+import struct
+import zlib
+from .tetromino import Tetromino, TetrominoBag, SHAPES
+from .storage import atomic_write
+
+#Save file layout: header, then a zlib-compressed body with mode name, palette,
+#one palette index per cell, pieces, stats and bag
+MAGIC = b"TSAV"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+STATE = struct.Struct("<qHIH?IH")
+PIECE = struct.Struct("<Bbhh")
+BAG = struct.Struct("<qIB")
+
+#Piece type indices, 255 marks a missing piece
+PIECE_TYPES = tuple(SHAPES)
+NO_PIECE = 255
+LINE_COUNTS = (1, 2, 3, 4)
 
 class SaveGame:
     @staticmethod
     def save(game):
+        #Snapshot of the engine state, safe to serialize on another thread
         return {
             "score": game.score,
             "level": game.level,
             "lines_cleared": game.lines_cleared,
             "fall_speed": game.fall_speed,
             "game_mode": game.game_mode,
-            "grid": [[cell if cell != 0 else 0 for cell in row] for row in game.grid.cells],
+            "grid": [[cell if cell != 0 else 0 for cell in row] for row in game.board.cells],
             "current_tetromino": game.current_tetromino.to_dict() if game.current_tetromino else None,
             "next_tetromino": game.next_tetromino.to_dict() if game.next_tetromino else None,
             "held_tetromino": game.held_tetromino.to_dict() if game.held_tetromino else None,
             "can_hold": game.can_hold,
-            "stats": game.stats,
-            "bag": game.bag.to_dict()
+            "stats": {
+                "tetrominos": dict(game.stats["tetrominos"]),
+                "lines": dict(game.stats["lines"]),
+                "time": game.stats["time"]
+            },
+            "bag": {**game.bag.to_dict(), "bag": list(game.bag.bag)}
         }
 
     @staticmethod
     def load(game, data):
+        if len(data["grid"]) != game.board.rows or any(len(row) != game.board.cols for row in data["grid"]):
+            raise ValueError(f"Save does not fit the {game.board.rows}x{game.board.cols} board")
+        #Start from the same clean per-game state as a new game, so nothing of the game
+        #being replaced (game over, lock and clear delays, pending garbage) carries over
+        game.game_mode = data["game_mode"]
+        game.reset_state()
         game.score = data["score"]
         game.level = data["level"]
         game.lines_cleared = data["lines_cleared"]
         game.fall_speed = data["fall_speed"]
-        game.game_mode = data["game_mode"]
-        game.grid.cells = data["grid"]
+        game.board.set_cells(data["grid"])
         game.current_tetromino = Tetromino.from_dict(data["current_tetromino"]) if data["current_tetromino"] else None
         game.next_tetromino = Tetromino.from_dict(data["next_tetromino"]) if data["next_tetromino"] else None
         game.held_tetromino = Tetromino.from_dict(data["held_tetromino"]) if data["held_tetromino"] else None
         game.can_hold = data["can_hold"]
-        game.stats = data["stats"]
-        game.bag = TetrominoBag.from_dict(data["bag"])
\ No newline at end of file
+        #Keep the engine's stats key order, JSON saves turned the line count keys into strings
+        game.stats = {
+            "tetrominos": {shape_type: data["stats"]["tetrominos"][shape_type] for shape_type in game.stats["tetrominos"]},
+            "lines": {int(lines): count for lines, count in data["stats"]["lines"].items()},
+            "time": data["stats"]["time"]
+        }
+        game.bag = TetrominoBag.from_dict(data["bag"])
+        #Play time continues from the saved time, gravity from now
+        game.start_time = game.now - game.stats["time"] * 1000
+        game.fall_time = game.now
+
+    @staticmethod
+    def to_bytes(data):
+        #Encode a save() snapshot in the binary format
+        body = bytearray()
+        mode = data["game_mode"].encode("utf-8")
+        body += STATE.pack(data["score"], data["level"], data["lines_cleared"], data["fall_speed"],
+                           data["can_hold"], data["stats"]["time"], len(mode))
+        body += mode
+
+        grid = data["grid"]
+        palette = {}
+        cells = bytearray()
+        for row in grid:
+            for cell in row:
+                if cell == 0:
+                    cells.append(0)
+                else:
+                    cells.append(palette.setdefault(tuple(cell), len(palette) + 1))
+        body += struct.pack("<HHB", len(grid), len(grid[0]) if grid else 0, len(palette))
+        for color in palette:
+            body += bytes(color)
+        body += cells
+
+        for key in ("current_tetromino", "next_tetromino", "held_tetromino"):
+            piece = data[key]
+            if piece is None:
+                body += PIECE.pack(NO_PIECE, 0, 0, 0)
+            else:
+                body += PIECE.pack(PIECE_TYPES.index(piece["shape_type"]), piece["rotation"], piece["x"], piece["y"])
+
+        stats = data["stats"]
+        body += struct.pack(f"<{len(PIECE_TYPES)}I", *(stats["tetrominos"][shape_type] for shape_type in PIECE_TYPES))
+        body += struct.pack(f"<{len(LINE_COUNTS)}I", *(stats["lines"][lines] for lines in LINE_COUNTS))
+
+        bag = data["bag"]
+        seed = bag["seed"] if bag["seed"] is not None else -1
+        body += BAG.pack(seed, bag["fills"], len(bag["bag"]))
+        body += bytes(PIECE_TYPES.index(shape_type) for shape_type in bag["bag"])
+        return HEADER.pack(MAGIC, VERSION) + zlib.compress(bytes(body), 9)
+
+    @staticmethod
+    def from_bytes(raw):
+        #Decode the binary format into the same dict save() returns
+        magic, version = HEADER.unpack_from(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a supported save file")
+        body = zlib.decompress(raw[HEADER.size:])
+        score, level, lines_cleared, fall_speed, can_hold, time, mode_length = STATE.unpack_from(body)
+        offset = STATE.size
+        game_mode = body[offset:offset + mode_length].decode("utf-8")
+        offset += mode_length
+
+        rows, cols, palette_size = struct.unpack_from("<HHB", body, offset)
+        offset += 5
+        palette = [0] + [tuple(body[offset + i * 3:offset + i * 3 + 3]) for i in range(palette_size)]
+        offset += palette_size * 3
+        grid = [[palette[index] for index in body[offset + y * cols:offset + (y + 1) * cols]] for y in range(rows)]
+        offset += rows * cols
+
+        pieces = []
+        for _ in range(3):
+            piece_type, rotation, x, y = PIECE.unpack_from(body, offset)
+            offset += PIECE.size
+            pieces.append(None if piece_type == NO_PIECE else
+                          {"shape_type": PIECE_TYPES[piece_type], "rotation": rotation, "x": x, "y": y})
+
+        tetrominos = struct.unpack_from(f"<{len(PIECE_TYPES)}I", body, offset)
+        offset += 4 * len(PIECE_TYPES)
+        lines = struct.unpack_from(f"<{len(LINE_COUNTS)}I", body, offset)
+        offset += 4 * len(LINE_COUNTS)
+
+        seed, fills, bag_length = BAG.unpack_from(body, offset)
+        offset += BAG.size
+        bag = [PIECE_TYPES[index] for index in body[offset:offset + bag_length]]
+        return {
+            "score": score,
+            "level": level,
+            "lines_cleared": lines_cleared,
+            "fall_speed": fall_speed,
+            "game_mode": game_mode,
+            "grid": grid,
+            "current_tetromino": pieces[0],
+            "next_tetromino": pieces[1],
+            "held_tetromino": pieces[2],
+            "can_hold": can_hold,
+            "stats": {
+                "tetrominos": dict(zip(PIECE_TYPES, tetrominos)),
+                "lines": dict(zip(LINE_COUNTS, lines)),
+                "time": time
+            },
+            "bag": {"bag": bag, "seed": seed if seed >= 0 else None, "fills": fills}
+        }
+
+    @staticmethod
+    def write(path, data):
+        #Encode and atomically replace the save file
+        atomic_write(path, SaveGame.to_bytes(data))
+
+    @staticmethod
+    def read(path):
+        #Read a binary save, or a save from the JSON format it replaced
+        with open(path, "rb") as f:
+            raw = f.read()
+        if raw.startswith(MAGIC):
+            return SaveGame.from_bytes(raw)
+        return json.loads(raw.decode("utf-8"))
@@ -0,0 +1,191 @@
+from collections import deque, namedtuple
+from .tetromino import ORIENTATIONS
+
+#A reachable final position and the inputs that lead there from spawn
+Placement = namedtuple("Placement", ["shape_type", "rotation", "x", "y", "path"])
+
+def enumerate_placements(board, shape_type, rotation=0, x=3, y=0):
+    #Every distinct final placement reachable from the given piece state using left, right,
+    #rotations with the real wall kick tables and sonic drops, so tucks and kick-ins are found.
+    #States are searched breadth first, so each placement carries a shortest input path
+    states = ORIENTATIONS[shape_type]
+    fits = board.fits
+    start = (rotation, x, y)
+    if not fits(states[rotation].masks, x, y):
+        return []
+    parents = {start: None}
+    queue = deque([start])
+    placements = {}
+    while queue:
+        state = queue.popleft()
+        rotation, x, y = state
+        masks = states[rotation].masks
+        landed = not fits(masks, x, y + 1)
+        if landed:
+            key = _footprint(masks, x, y)
+            if key not in placements:
+                placements[key] = state
+        for move, next_state in _moves(fits, states, rotation, x, y, landed):
+            if next_state not in parents:
+                parents[next_state] = (state, move)
+                queue.append(next_state)
+    return [Placement(shape_type, rotation, x, y, _path(parents, (rotation, x, y)))
+            for rotation, x, y in placements.values()]
+
+def _moves(fits, states, rotation, x, y, landed):
+    #Successor states of a piece state
+    masks = states[rotation].masks
+    if fits(masks, x - 1, y):
+        yield "left", (rotation, x - 1, y)
+    if fits(masks, x + 1, y):
+        yield "right", (rotation, x + 1, y)
+    for move, target, kicks in (("rotate_cw", (rotation + 1) % 4, states[rotation].kicks_cw),
+                                ("rotate_ccw", (rotation - 1) % 4, states[rotation].kicks_ccw)):
+        target_masks = states[target].masks
+        for dx, dy in kicks:
+            if fits(target_masks, x + dx, y + dy):
+                yield move, (target, x + dx, y + dy)
+                break
+    if not landed:
+        drop_y = y + 1
+        while fits(masks, x, drop_y + 1):
+            drop_y += 1
+        yield "sonic_drop", (rotation, x, drop_y)
+
+def _footprint(masks, x, y):
+    #Board rows covered by a piece, identical for symmetric orientations
+    min_x, _, rows = masks
+    return tuple((y + dy, mask << (x + min_x)) for dy, mask in rows)
+
+def _path(parents, state):
+    path = []
+    while parents[state] is not None:
+        state, move = parents[state]
+        path.append(move)
+    path.reverse()
+    return path
+
+class Heuristic:
+    #Weighted board evaluation after a placement, features from Dellacherie's player
+    DEFAULT_WEIGHTS = {
+        "landing_height": -4.500158825082766,
+        "eroded_cells": 3.4181268101392694,
+        "row_transitions": -3.2178882868487753,
+        "column_transitions": -9.348695305445199,
+        "holes": -7.899265427351652,
+        "wells": -3.3855972247263626
+    }
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+
+    def score(self, board, placement):
+        #Evaluate the board that results from locking a placement
+        orientation = ORIENTATIONS[placement.shape_type][placement.rotation]
+        min_x, _, rows = orientation.masks
+        bits = list(board.bits)
+        full_mask = board.full_mask
+        piece_rows = {}
+        for dy, mask in rows:
+            row = placement.y + dy
+            if row < 0:
+                return float("-inf")
+            bits[row] |= mask << (placement.x + min_x)
+            piece_rows[row] = mask
+        cleared = [row for row in piece_rows if bits[row] == full_mask]
+        eroded = len(cleared) * sum(bin(piece_rows[row]).count("1") for row in cleared)
+        if cleared:
+            bits = [0] * len(cleared) + [row for row in bits if row != full_mask]
+        _, _, min_y, max_y = orientation.bounding_box
+        features = {
+            "landing_height": board.rows - placement.y - (min_y + max_y) / 2,
+            "eroded_cells": eroded
+        }
+        features.update(board_features(bits, board.cols))
+        return sum(self.weights[name] * value for name, value in features.items() if name in self.weights)
+
+def board_features(bits, cols):
+    #Row and column transitions, holes and well sums of a bitboard
+    full_mask = (1 << cols) - 1
+    wall_mask = (1 << (cols + 2)) - 1
+    row_transitions = 0
+    column_transitions = 0
+    holes = 0
+    wells = 0
+    cover = 0
+    above = 0
+    well_depths = {}
+    for row in bits:
+        #Rows are padded with filled walls on both sides
+        padded = (row << 1) | 1 | (1 << (cols + 1))
+        row_transitions += bin((padded ^ (padded >> 1)) & (wall_mask >> 1)).count("1")
+        column_transitions += bin(row ^ above).count("1")
+        holes += bin(cover & ~row & full_mask).count("1")
+        well_mask = ~padded & (padded << 1) & (padded >> 1) & (full_mask << 1)
+        depths = {}
+        while well_mask:
+            bit = well_mask & -well_mask
+            depth = well_depths.get(bit, 0) + 1
+            depths[bit] = depth
+            wells += depth
+            well_mask ^= bit
+        well_depths = depths
+        cover |= row
+        above = row
+    column_transitions += bin(~above & full_mask).count("1")
+    return {
+        "row_transitions": row_transitions,
+        "column_transitions": column_transitions,
+        "holes": holes,
+        "wells": wells
+    }
+
+class Autopilot:
+    #Plays an engine with best_placement, one planned input every move_delay ms of engine time.
+    #choose(engine) can replace best_placement to pick the placement of the current tetromino
+    def __init__(self, heuristic=None, move_delay=0, choose=None):
+        self.heuristic = heuristic or Heuristic()
+        self.move_delay = move_delay
+        self.choose = choose or self.best_placement
+        self.reset()
+
+    def best_placement(self, engine):
+        return best_placement(engine.board, engine.current_tetromino, self.heuristic)
+
+    def reset(self):
+        self.piece = None
+        self.plan = deque()
+        self.expected = None
+        self.last_move = 0
+
+    def step(self, engine):
+        #Plan a placement for each new tetromino and feed its inputs to the engine. The plan is
+        #redone from the current state whenever gravity has moved the piece off the planned path
+        tetromino = engine.current_tetromino
+        if tetromino is not self.piece or piece_state(tetromino) != self.expected:
+            self.piece = tetromino
+            self.expected = piece_state(tetromino)
+            placement = self.choose(engine)
+            self.plan = deque(placement.path if placement else [])
+            self.plan.append("hard_drop")
+        current_time = engine.clock()
+        while self.plan and not engine.over and current_time - self.last_move >= self.move_delay:
+            engine.apply(self.plan.popleft())
+            self.last_move = current_time
+            self.expected = piece_state(engine.current_tetromino)
+            if self.move_delay:
+                break
+
+def piece_state(tetromino):
+    #Rotation and position a plan was computed from
+    return tetromino.rotation, tetromino.x, tetromino.y
+
+def best_placement(board, tetromino, heuristic=None):
+    #Highest scoring placement for a piece, None when it cannot move at all
+    heuristic = heuristic or Heuristic()
+    placements = enumerate_placements(board, tetromino.shape_type, tetromino.rotation, tetromino.x, tetromino.y)
+    if not placements:
+        return None
+    return max(placements, key=lambda placement: heuristic.score(board, placement))
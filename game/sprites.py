@@ -0,0 +1,30 @@
+import pygame
+
+class SpriteCache:
+    #Pre-rendered cell sprites keyed by (color, alpha, size, border width)
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, color, alpha, size, border_width):
+        #Get a cached cell sprite, rendering it on first use
+        key = (tuple(color), alpha, size, border_width)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.render(key[0], alpha, size, border_width)
+            self.sprites[key] = sprite
+        return sprite
+
+    def render(self, color, alpha, size, border_width):
+        #Render a filled cell with a lighter border
+        cell_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        cell_surface.fill((*color, alpha))
+        border_color = tuple(min(255, c + 40) for c in color)
+        pygame.draw.rect(cell_surface, (*border_color, alpha), (0, 0, size, size), border_width)
+        if pygame.display.get_surface() is not None:
+            cell_surface = cell_surface.convert_alpha()
+        cell_surface.set_alpha(alpha)
+        return cell_surface
+
+    def clear(self):
+        #Drop all sprites, called when the theme changes
+        self.sprites.clear()
@@ -0,0 +1,84 @@
+import atexit
+import logging
+import os
+import tempfile
+import threading
+
+def atomic_write(path, data):
+    #Write bytes to a temporary file next to path, then rename it over path,
+    #so readers and crashes only ever see the old or the new contents
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def write_text(path, text):
+    atomic_write(path, text.encode("utf-8"))
+
+class PersistenceService:
+    #Write-behind file writes on a background thread. Writes to the same path are
+    #coalesced so only the newest data is written, pending writes are flushed every
+    #interval seconds, on request and at exit. Callers never block on disk I/O
+    #unless they wait for a flush.
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.flush_requested = False
+        self.busy = False
+        self.closed = False
+        self.writes = 0
+        self.thread = threading.Thread(target=self.run, name="persistence", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, path, write, *args):
+        #Queue write(path, *args), replacing any pending write to the same path
+        with self.condition:
+            self.pending[path] = (write, args)
+
+    def flush(self, wait=True):
+        #Write everything pending now, optionally waiting until it is on disk
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            while wait and (self.pending or self.busy) and self.thread.is_alive():
+                self.condition.wait()
+
+    def close(self):
+        #Flush and stop the worker
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.flush_requested, self.interval)
+                pending, self.pending = self.pending, {}
+                self.flush_requested = False
+                self.busy = True
+                closed = self.closed
+            for path, (write, args) in pending.items():
+                try:
+                    write(path, *args)
+                    self.writes += 1
+                except Exception as e:
+                    logging.error(f"Failed to write {path}: {e}")
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+                if closed and not self.pending:
+                    return
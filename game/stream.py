@@ -0,0 +1,496 @@
+import argparse
+import atexit
+import logging
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from config import GARBAGE_COLOR
+from .board import Board
+from .profiler import percentile
+from .replay import write_varint, read_varint
+from .save_game import PIECE, PIECE_TYPES, NO_PIECE
+from .tetromino import Tetromino
+
+#Spectator stream layout: a sequence of messages, each a type byte, a varint time and a varint
+#payload length followed by the payload. A keyframe carries the absolute engine time in ms and
+#the visible game state, every other message carries the ms since the previous message and one
+#change. Spectators joining mid-stream skip everything up to the next keyframe.
+KEYFRAME, SPAWN, MOVE, ROTATE, LOCK, CLEAR, HOLD, SCORE, LEVEL, GARBAGE, GAME_OVER = range(11)
+MESSAGES = ("keyframe", "spawn", "move", "rotate", "lock", "clear", "hold", "score", "level", "garbage", "game_over")
+SCORE_VALUE = struct.Struct("<q")
+LEVEL_VALUE = struct.Struct("<H")
+GARBAGE_VALUE = struct.Struct("<HH")
+#Keyframe body, zlib-compressed: score, level, lines and mode name length, the mode, then board
+#size, palette and one palette index per cell, then current, next and held piece. Unlike a save
+#it has no bag, the seed and bag contents would let spectators predict every coming piece
+KEYFRAME_STATE = struct.Struct("<qHIH")
+KEYFRAME_GRID = struct.Struct("<HHB")
+
+#Seconds of traffic the bytes per second rate is averaged over
+RATE_WINDOW = 5.0
+
+def pack_piece(tetromino):
+    if tetromino is None:
+        return PIECE.pack(NO_PIECE, 0, 0, 0)
+    return PIECE.pack(PIECE_TYPES.index(tetromino.shape_type), tetromino.rotation, tetromino.x, tetromino.y)
+
+def unpack_piece(data, offset=0):
+    piece_type, rotation, x, y = PIECE.unpack_from(data, offset)
+    return None if piece_type == NO_PIECE else Tetromino(PIECE_TYPES[piece_type], rotation, x, y)
+
+def pack_keyframe(engine):
+    #Visible state of an engine as a keyframe payload
+    body = bytearray()
+    mode = engine.game_mode.encode("utf-8")
+    body += KEYFRAME_STATE.pack(engine.score, engine.level, engine.lines_cleared, len(mode))
+    body += mode
+    board = engine.board
+    palette = {}
+    cells = bytearray()
+    for row in board.cells:
+        for cell in row:
+            cells.append(palette.setdefault(tuple(cell), len(palette) + 1) if cell else 0)
+    body += KEYFRAME_GRID.pack(board.rows, board.cols, len(palette))
+    for color in palette:
+        body += bytes(color)
+    body += cells
+    for tetromino in (engine.current_tetromino, engine.next_tetromino, engine.held_tetromino):
+        body += pack_piece(tetromino)
+    return zlib.compress(bytes(body))
+
+def unpack_keyframe(payload):
+    #Decode a keyframe payload into a dict of the state it carries
+    body = zlib.decompress(payload)
+    score, level, lines_cleared, mode_length = KEYFRAME_STATE.unpack_from(body)
+    offset = KEYFRAME_STATE.size
+    game_mode = body[offset:offset + mode_length].decode("utf-8")
+    offset += mode_length
+    rows, cols, palette_size = KEYFRAME_GRID.unpack_from(body, offset)
+    offset += KEYFRAME_GRID.size
+    palette = [0] + [tuple(body[offset + i * 3:offset + i * 3 + 3]) for i in range(palette_size)]
+    offset += palette_size * 3
+    grid = [[palette[index] for index in body[offset + y * cols:offset + (y + 1) * cols]] for y in range(rows)]
+    offset += rows * cols
+    pieces = [unpack_piece(body, offset + index * PIECE.size) for index in range(3)]
+    return {"score": score, "level": level, "lines_cleared": lines_cleared, "game_mode": game_mode,
+            "grid": grid, "pieces": pieces}
+
+class FileSink:
+    #Appends the stream to a file, spectators read it back or follow it as it grows
+    def __init__(self, path):
+        self.file = open(path, "ab")
+
+    def poll(self):
+        return False
+
+    def send(self, data, keyframe):
+        self.file.write(data)
+        self.file.flush()
+
+    def resync(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+class TcpSink:
+    #Serves the stream to every spectator connected to a local TCP port. New and resynced
+    #spectators are sent data from the next keyframe on, a spectator that cannot keep up is dropped
+    def __init__(self, host, port, send_timeout=1.0):
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.send_timeout = send_timeout
+        #Connected sockets, and whether each has been sent a keyframe yet
+        self.clients = {}
+
+    def poll(self):
+        #Accept waiting spectators, True if one needs a keyframe
+        joined = False
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return joined
+            client.setblocking(True)
+            client.settimeout(self.send_timeout)
+            self.clients[client] = False
+            joined = True
+
+    def send(self, data, keyframe):
+        for client, synced in list(self.clients.items()):
+            if not synced and not keyframe:
+                continue
+            try:
+                client.sendall(data)
+                self.clients[client] = True
+            except OSError:
+                client.close()
+                del self.clients[client]
+
+    def resync(self):
+        for client in self.clients:
+            self.clients[client] = False
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        self.clients.clear()
+        self.server.close()
+
+def open_sink(target):
+    #tcp://host:port serves spectators on that address, anything else is a file path
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        return TcpSink(host or "127.0.0.1", int(port))
+    return FileSink(target)
+
+class StatePublisher:
+    #Publishes an engine's state changes for spectators: a keyframe when a game starts or a
+    #spectator joins, then one small delta per spawn, move, rotation, lock, clear, hold, score,
+    #level and garbage change. Messages are encoded on the game thread, which only appends them
+    #to a buffer, and written out by a background thread. If the writer falls max_backlog bytes
+    #behind the buffer is dropped and the stream restarts from a fresh keyframe.
+    def __init__(self, target, engine, max_backlog=1 << 20):
+        self.engine = engine
+        self.sink = open_sink(target)
+        self.max_backlog = max_backlog
+        #Guards the buffer and both request flags, which the game thread and the writer both set.
+        #A reentrant lock, so a keyframe consumes its request and is enqueued without letting go
+        self.condition = threading.Condition(threading.RLock())
+        self.pending = []
+        self.pending_bytes = 0
+        self.closed = False
+        self.keyframe_requested = True
+        self.resync_requested = False
+        self.last_time = 0
+        self.last_score = None
+        self.last_level = None
+        #Metrics: totals, encode time of recent events and keyframes in seconds and (time, size) of recent messages
+        self.messages = 0
+        self.keyframes = 0
+        self.bytes_published = 0
+        self.bytes_written = 0
+        self.dropped_bytes = 0
+        self.encode_times = deque(maxlen=1024)
+        self.keyframe_times = deque(maxlen=64)
+        self.traffic = deque()
+        engine.subscribe(self.on_event)
+        self.thread = threading.Thread(target=self.run, name="spectator-stream", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def on_event(self, event, *args):
+        #Engine listener, runs on the game thread. Times the encoding of the deltas an event produced
+        started = time.perf_counter()
+        messages, keyframes = self.messages, self.keyframes
+        if self.encode(event, *args) and event in ("tick", "lock", "game_over"):
+            #Score and level changes are sent once per tick, so drop points for every row are coalesced
+            self.sync()
+        if self.messages != messages and self.keyframes == keyframes:
+            self.encode_times.append(time.perf_counter() - started)
+
+    def request_keyframe(self):
+        #Send a keyframe before the next delta, safe from any thread
+        with self.condition:
+            self.keyframe_requested = True
+
+    def encode(self, event, *args):
+        #Publish the deltas of an event, False while spectators are waiting for a keyframe
+        engine = self.engine
+        tetromino = engine.current_tetromino
+        if event == "start":
+            self.request_keyframe()
+            return False
+        with self.condition:
+            requested = self.keyframe_requested
+        if requested:
+            if event not in ("spawn", "tick") or tetromino is None or not self.keyframe():
+                return False
+        elif event in ("spawn", "hold"):
+            self.publish(SPAWN if event == "spawn" else HOLD, pack_piece(tetromino) + pack_piece(engine.next_tetromino)
+                         + pack_piece(engine.held_tetromino))
+        elif event in ("move", "soft_drop", "fall", "rotate"):
+            self.publish(ROTATE if event == "rotate" else MOVE, pack_piece(tetromino))
+        elif event == "lock":
+            self.publish(LOCK, pack_piece(tetromino))
+        elif event == "clear":
+            rows = [idx for idx, _ in engine.board.cleared_lines]
+            self.publish(CLEAR, struct.pack(f"<B{len(rows)}H", len(rows), *rows))
+        elif event == "garbage":
+            self.publish(GARBAGE, GARBAGE_VALUE.pack(*args))
+        elif event == "game_over":
+            self.publish(GAME_OVER, b"")
+        return True
+
+    def sync(self):
+        #Publish score and level changes
+        engine = self.engine
+        if engine.score != self.last_score:
+            self.publish(SCORE, SCORE_VALUE.pack(engine.score))
+            self.last_score = engine.score
+        if engine.level != self.last_level:
+            self.publish(LEVEL, LEVEL_VALUE.pack(engine.level))
+            self.last_level = engine.level
+
+    def keyframe(self):
+        #Publish the whole game state if one was requested, deltas that follow apply to it. The request
+        #is consumed and the keyframe enqueued under the lock, so a spectator joining meanwhile is
+        #either served by this keyframe or leaves a new request behind
+        started = time.perf_counter()
+        engine = self.engine
+        with self.condition:
+            if not self.keyframe_requested:
+                return False
+            self.keyframe_requested = False
+            self.last_score = engine.score
+            self.last_level = engine.level
+            self.last_time = engine.now
+            message = bytearray([KEYFRAME])
+            write_varint(message, max(engine.now, 0))
+            payload = pack_keyframe(engine)
+            write_varint(message, len(payload))
+            message += payload
+            self.keyframes += 1
+            self.keyframe_times.append(time.perf_counter() - started)
+            self.enqueue(bytes(message), True)
+        return True
+
+    def publish(self, kind, payload):
+        now = self.engine.now
+        message = bytearray([kind])
+        write_varint(message, max(now - self.last_time, 0))
+        write_varint(message, len(payload))
+        message += payload
+        self.last_time = now
+        self.enqueue(bytes(message), False)
+
+    def enqueue(self, message, keyframe):
+        with self.condition:
+            if self.pending_bytes + len(message) > self.max_backlog and not keyframe:
+                #The writer is stuck, drop the backlog and start over from a keyframe
+                self.dropped_bytes += self.pending_bytes + len(message)
+                self.pending = []
+                self.pending_bytes = 0
+                self.keyframe_requested = True
+                self.resync_requested = True
+                return
+            self.pending.append((message, keyframe))
+            self.pending_bytes += len(message)
+            self.messages += 1
+            self.bytes_published += len(message)
+            self.traffic.append((time.perf_counter(), len(message)))
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.pending, 0.1)
+                pending, self.pending = self.pending, []
+                self.pending_bytes = 0
+                closed = self.closed
+                resync, self.resync_requested = self.resync_requested, False
+            try:
+                if resync:
+                    self.sink.resync()
+                if self.sink.poll():
+                    self.request_keyframe()
+                #Join chunks up to each keyframe so a spectator starts exactly at one
+                start = 0
+                for index, (message, keyframe) in enumerate(pending):
+                    if keyframe and index > start:
+                        self.write(pending[start:index], False)
+                        start = index
+                if start < len(pending):
+                    self.write(pending[start:], pending[start][1])
+            except Exception as e:
+                logging.error(f"Spectator stream failed: {e}")
+            if closed:
+                self.sink.close()
+                return
+
+    def write(self, messages, keyframe):
+        data = b"".join(message for message, _ in messages)
+        self.sink.send(data, keyframe)
+        self.bytes_written += len(data)
+
+    def close(self):
+        #Write what is pending and stop the writer
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        logging.getLogger("tetris.stream").info("Spectator stream: %d bytes in %d messages, %d dropped; %s",
+                                                self.bytes_written, self.messages, self.dropped_bytes,
+                                                "; ".join(self.summary_lines()))
+
+    def bytes_per_second(self):
+        #Published bytes per second over the last RATE_WINDOW seconds
+        now = time.perf_counter()
+        traffic = self.traffic
+        while traffic and traffic[0][0] < now - RATE_WINDOW:
+            traffic.popleft()
+        return sum(size for _, size in traffic) / RATE_WINDOW
+
+    def summary_lines(self):
+        #Rate and encode time, for the profiler overlay and capture host sizing
+        encode = sorted(self.encode_times)
+        keyframe = sorted(self.keyframe_times)
+        return (f"stream {self.bytes_per_second() / 1024:.2f} KiB/s",
+                f"{self.messages} msgs, {self.keyframes} keys",
+                f"encode p50 {percentile(encode, 0.5) * 1e6:.1f} us",
+                f"encode p99 {percentile(encode, 0.99) * 1e6:.1f} us",
+                f"keyframe {percentile(keyframe, 0.5) * 1000:.2f} ms")
+
+class Spectator:
+    #Headless spectator, rebuilds the game from a stream fed to it in chunks of any size
+    def __init__(self):
+        self.buffer = bytearray()
+        self.synced = False
+        self.board = None
+        self.current_tetromino = None
+        self.next_tetromino = None
+        self.held_tetromino = None
+        self.game_mode = None
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.over = False
+        self.time = 0
+        self.counts = dict.fromkeys(MESSAGES, 0)
+        #Messages of unknown kind, skipped, and messages that failed to apply, each followed by a resync
+        self.skipped = 0
+        self.errors = 0
+
+    def feed(self, data):
+        #Apply every complete message in data and what was left over from the last call,
+        #returns the names of the messages applied
+        buffer = self.buffer
+        buffer += data
+        applied = []
+        position = 0
+        while True:
+            try:
+                kind = buffer[position]
+                value, offset = read_varint(buffer, position + 1)
+                length, offset = read_varint(buffer, offset)
+            except IndexError:
+                break
+            if offset + length > len(buffer):
+                break
+            payload = bytes(buffer[offset:offset + length])
+            position = offset + length
+            if kind >= len(MESSAGES):
+                #A newer publisher or a corrupt byte, the length still frames the message
+                self.skipped += 1
+                continue
+            if kind == KEYFRAME:
+                self.synced = True
+                self.time = value
+            elif not self.synced:
+                continue
+            else:
+                self.time += value
+            try:
+                self.apply(kind, payload)
+            except (ValueError, IndexError, AttributeError, struct.error, zlib.error) as e:
+                #The state can no longer be trusted, wait for the next keyframe
+                logging.error(f"Spectator resyncing after a bad {MESSAGES[kind]} message: {e}")
+                self.errors += 1
+                self.synced = False
+                continue
+            self.counts[MESSAGES[kind]] += 1
+            applied.append(MESSAGES[kind])
+        del buffer[:position]
+        return applied
+
+    def apply(self, kind, payload):
+        if kind == KEYFRAME:
+            data = unpack_keyframe(payload)
+            self.board = Board(len(data["grid"]), len(data["grid"][0]))
+            self.board.set_cells(data["grid"])
+            self.current_tetromino, self.next_tetromino, self.held_tetromino = data["pieces"]
+            self.game_mode = data["game_mode"]
+            self.score = data["score"]
+            self.level = data["level"]
+            self.lines_cleared = data["lines_cleared"]
+            self.over = False
+        elif kind in (SPAWN, HOLD):
+            self.current_tetromino, self.next_tetromino, self.held_tetromino = (
+                unpack_piece(payload, offset) for offset in (0, PIECE.size, 2 * PIECE.size))
+        elif kind in (MOVE, ROTATE):
+            self.current_tetromino = unpack_piece(payload)
+        elif kind == LOCK:
+            self.board.place(unpack_piece(payload))
+            self.current_tetromino = None
+        elif kind == CLEAR:
+            rows = struct.unpack_from(f"<{payload[0]}H", payload, 1)
+            self.lines_cleared += self.board.clear_lines(rows)
+        elif kind == GARBAGE:
+            count, hole = GARBAGE_VALUE.unpack(payload)
+            self.board.add_garbage(count, hole, GARBAGE_COLOR)
+        elif kind == SCORE:
+            self.score = SCORE_VALUE.unpack(payload)[0]
+        elif kind == LEVEL:
+            self.level = LEVEL_VALUE.unpack(payload)[0]
+        elif kind == GAME_OVER:
+            self.over = True
+
+    def render(self):
+        #Text picture of the board with the current piece
+        cells = [["#" if cell else "." for cell in row] for row in self.board.cells]
+        tetromino = self.current_tetromino
+        if tetromino is not None:
+            for x, y in tetromino.orientation.cells:
+                if 0 <= tetromino.y + y < self.board.rows and 0 <= tetromino.x + x < self.board.cols:
+                    cells[tetromino.y + y][tetromino.x + x] = "@"
+        return "\n".join("".join(row) for row in cells)
+
+    def status(self):
+        return (f"{self.time / 1000:8.1f}s {self.game_mode} score={self.score} level={self.level} "
+                f"lines={self.lines_cleared}{' GAME OVER' if self.over else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless spectator for a game's state stream")
+    parser.add_argument("source", help="tcp://host:port of a running game or a stream file")
+    parser.add_argument("--follow", action="store_true", help="keep reading a stream file as it grows")
+    parser.add_argument("--board", action="store_true", help="print the board after every lock")
+    args = parser.parse_args()
+
+    spectator = Spectator()
+    if args.source.startswith("tcp://"):
+        host, _, port = args.source[len("tcp://"):].rpartition(":")
+        connection = socket.create_connection((host or "127.0.0.1", int(port)))
+        read = lambda: connection.recv(65536)
+    else:
+        stream_file = open(args.source, "rb")
+        read = lambda: stream_file.read(65536)
+    received = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            data = read()
+            if not data:
+                if args.follow and not args.source.startswith("tcp://"):
+                    time.sleep(0.1)
+                    continue
+                break
+            received += len(data)
+            for message in spectator.feed(data):
+                if message in ("lock", "game_over", "keyframe") and spectator.synced:
+                    print(spectator.status())
+                    if args.board and message == "lock":
+                        print(spectator.render())
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"{received} bytes in {elapsed:.1f} s, " + ", ".join(f"{name} {count}" for name, count in spectator.counts.items() if count)
+          + f", {spectator.skipped} skipped, {spectator.errors} errors", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,84 @@
-import logging
 import random
+from collections import namedtuple
 from config import COLORS, WALL_KICK_I, WALL_KICK_OTHER, WALL_KICK_I_CCW, WALL_KICK_OTHER_CCW
+from .trace import TRACE
 
-#Configure logging
-logging.basicConfig(
-    filename="tetris.log",
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+#Shape matrices for each tetromino type in spawn orientation
+SHAPES = {
+    'I': [[1, 1, 1, 1]],
+    'O': [[1, 1], [1, 1]],
+    'T': [[0, 1, 0], [1, 1, 1]],
+    'S': [[0, 1, 1], [1, 1, 0]],
+    'Z': [[1, 1, 0], [0, 1, 1]],
+    'J': [[1, 0, 0], [1, 1, 1]],
+    'L': [[0, 0, 1], [1, 1, 1]]
+}
+
+#Immutable per-orientation data shared by every piece of the same type
+Orientation = namedtuple("Orientation", ["shape", "cells", "bounding_box", "masks", "bottoms", "kicks_cw", "kicks_ccw"])
+
+def shape_row_masks(shape):
+    #Build (min_x, max_x, ((dy, row_mask), ...)) for a shape, masks are shifted so min_x is bit 0
+    columns = [x for row in shape for x, cell in enumerate(row) if cell]
+    min_x, max_x = min(columns), max(columns)
+    masks = []
+    for dy, row in enumerate(shape):
+        mask = 0
+        for x, cell in enumerate(row):
+            if cell:
+                mask |= 1 << (x - min_x)
+        if mask:
+            masks.append((dy, mask))
+    return min_x, max_x, tuple(masks)
+
+def _build_orientations(shape_type):
+    #Compute all four clockwise rotations of a shape with their kick tables
+    kicks_cw = WALL_KICK_I if shape_type == 'I' else WALL_KICK_OTHER
+    kicks_ccw = WALL_KICK_I_CCW if shape_type == 'I' else WALL_KICK_OTHER_CCW
+    orientations = []
+    shape = tuple(tuple(row) for row in SHAPES[shape_type])
+    for rotation in range(4):
+        cells = tuple((x, y) for y, row in enumerate(shape) for x, cell in enumerate(row) if cell)
+        bounding_box = (min(x for x, _ in cells), max(x for x, _ in cells),
+                        min(y for _, y in cells), max(y for _, y in cells))
+        #Lowest cell of each column the shape covers, as (x, y)
+        bottoms = tuple((x, max(cell_y for cell_x, cell_y in cells if cell_x == x)) for x in sorted({x for x, _ in cells}))
+        orientations.append(Orientation(shape, cells, bounding_box, shape_row_masks(shape), bottoms,
+                                        tuple(kicks_cw[rotation]), tuple(kicks_ccw[rotation])))
+        shape = tuple(zip(*shape[::-1]))
+    return tuple(orientations)
+
+ORIENTATIONS = {shape_type: _build_orientations(shape_type) for shape_type in SHAPES}
 
 class Tetromino:
-    def __init__(self, shape_type):
+    __slots__ = ("shape_type", "rotation", "x", "y", "_states")
+
+    def __init__(self, shape_type, rotation=0, x=3, y=0):
         self.shape_type = shape_type
-        self.color = COLORS[shape_type]
-        self.shape = self._get_shape_matrix(shape_type)
-        self.x = 3
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+        self._states = ORIENTATIONS[shape_type]
+
+    @property
+    def orientation(self):
+        return self._states[self.rotation]
+
+    @property
+    def shape(self):
+        return self._states[self.rotation].shape
+
+    @property
+    def color(self):
+        return COLORS[self.shape_type]
+
+    def get_masks(self):
+        #Row bitmasks of the current orientation
+        return self._states[self.rotation].masks
+
+    def respawn(self, x=3):
+        #Return to spawn position and orientation
+        self.x = x
         self.y = 0
         self.rotation = 0
 
@@ -22,7 +86,7 @@ class Tetromino:
         return {
             "shape_type": self.shape_type,
             "color": self.color,
-            "shape": self.shape,
+            "shape": [list(row) for row in self.shape],
             "x": self.x,
             "y": self.y,
             "rotation": self.rotation
@@ -32,104 +96,74 @@ class Tetromino:
     def from_dict(data):
         if data is None:
             return None
-        tetromino = Tetromino(data["shape_type"])
-        tetromino.color = data["color"]
-        tetromino.shape = data["shape"]
-        tetromino.x = data["x"]
-        tetromino.y = data["y"]
-        tetromino.rotation = data["rotation"]
-        return tetromino
-
-    def _get_shape_matrix(self, shape_type):
-        #Define shape matrices for each tetromino type
-        SHAPES = {
-            'I': [[1, 1, 1, 1]],
-            'O': [[1, 1], [1, 1]],
-            'T': [[0, 1, 0], [1, 1, 1]],
-            'S': [[0, 1, 1], [1, 1, 0]],
-            'Z': [[1, 1, 0], [0, 1, 1]],
-            'J': [[1, 0, 0], [1, 1, 1]],
-            'L': [[0, 0, 1], [1, 1, 1]]
-        }
-        return [row[:] for row in SHAPES[shape_type]]
+        return Tetromino(data["shape_type"], data["rotation"] % 4, data["x"], data["y"])
 
     def rotate_clockwise(self, grid):
         #Rotate clockwise with wall kicks
-        original_rotation = self.rotation
-        original_x, original_y = self.x, self.y
-        original_shape = [row[:] for row in self.shape]
-        self.rotation = (self.rotation + 1) % 4
-        self.shape = [list(row) for row in zip(*self.shape[::-1])]
-        kick_table = WALL_KICK_I if self.shape_type == 'I' else WALL_KICK_OTHER
-        logging.debug(f"Rotating {self.shape_type} clockwise from rotation {original_rotation} to {self.rotation}")
-        for dx, dy in kick_table[original_rotation]:
-            logging.debug(f"Trying wall kick: dx={dx}, dy={dy}")
-            temp_x, temp_y = self.x + dx, self.y + dy
-            if grid.is_valid_position(self, temp_x, temp_y):
-                self.x, self.y = temp_x, temp_y
-                logging.debug(f"Wall kick successful, new position: x={self.x}, y={self.y}")
-                return True
-
-        self.rotation = original_rotation
-        self.x, self.y = original_x, original_y
-        self.shape = original_shape
-        logging.debug("Rotation failed, state restored")
-        return False
+        if TRACE.rotation:
+            TRACE.record("rotation", "Rotating %s clockwise from rotation %d", self.shape_type, self.rotation)
+        return self._rotate(grid, (self.rotation + 1) % 4, self._states[self.rotation].kicks_cw)
 
     def rotate_counterclockwise(self, grid):
         #Rotate counterclockwise with wall kicks
-        original_rotation = self.rotation
-        original_x, original_y = self.x, self.y
-        original_shape = [row[:] for row in self.shape]
-        self.rotation = (self.rotation - 1) % 4
-        self.shape = [list(row)[::-1] for row in zip(*self.shape[::-1])]
-        kick_table = WALL_KICK_I_CCW if self.shape_type == 'I' else WALL_KICK_OTHER_CCW
-        logging.debug(f"Rotating {self.shape_type} counterclockwise from rotation {original_rotation} to {self.rotation}")
-        for dx, dy in kick_table[original_rotation]:
-            logging.debug(f"Trying wall kick: dx={dx}, dy={dy}")
+        if TRACE.rotation:
+            TRACE.record("rotation", "Rotating %s counterclockwise from rotation %d", self.shape_type, self.rotation)
+        return self._rotate(grid, (self.rotation - 1) % 4, self._states[self.rotation].kicks_ccw)
+
+    def _rotate(self, grid, rotation, kicks):
+        #Try each kick offset for the target orientation, nothing changes on failure
+        masks = self._states[rotation].masks
+        for dx, dy in kicks:
             temp_x, temp_y = self.x + dx, self.y + dy
-            if grid.is_valid_position(self, temp_x, temp_y):
+            fits = grid.fits(masks, temp_x, temp_y)
+            if TRACE.kicks:
+                TRACE.record("kicks", "Wall kick dx=%d dy=%d to x=%d, y=%d: %s", dx, dy, temp_x, temp_y, fits)
+            if fits:
+                self.rotation = rotation
                 self.x, self.y = temp_x, temp_y
-                logging.debug(f"Wall kick successful, new position: x={self.x}, y={self.y}")
                 return True
-
-        self.rotation = original_rotation
-        self.x, self.y = original_x, original_y
-        self.shape = original_shape
-        logging.debug("Rotation failed, state restored")
+        if TRACE.rotation:
+            TRACE.record("rotation", "Rotation of %s to %d failed", self.shape_type, rotation)
         return False
 
     def get_bounding_box(self):
         #Get the bounding box of the tetromino
-        min_x = min(x for y, row in enumerate(self.shape) for x, cell in enumerate(row) if cell)
-        max_x = max(x for y, row in enumerate(self.shape) for x, cell in enumerate(row) if cell)
-        min_y = min(y for y, row in enumerate(self.shape) for x, cell in enumerate(row) if cell)
-        max_y = max(y for y, row in enumerate(self.shape) for x, cell in enumerate(row) if cell)
-        return min_x, max_x, min_y, max_y
+        return self._states[self.rotation].bounding_box
 
 class TetrominoBag:
-    def __init__(self):
+    def __init__(self, seed=None):
         self.shapes = ['I', 'O', 'T', 'S', 'Z', 'J', 'L']
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.fills = 0
         self.bag = []
         self.fill_bag()
 
     def to_dict(self):
-        return {"bag": self.bag}
+        return {"bag": self.bag, "seed": self.seed, "fills": self.fills}
 
     @staticmethod
     def from_dict(data):
-        bag = TetrominoBag()
-        bag.bag = data["bag"]
+        bag = TetrominoBag(data.get("seed"))
+        if bag.seed is not None:
+            #Replay the shuffles already drawn so the sequence continues where it stopped
+            while bag.fills < data.get("fills", 1):
+                bag.bag = []
+                bag.fill_bag()
+        bag.bag = list(data["bag"])
         return bag
 
     def fill_bag(self):
         self.bag.extend(self.shapes)
-        random.shuffle(self.bag)
-        logging.debug(f"Bag filled and shuffled: {self.bag}")
+        self.random.shuffle(self.bag)
+        self.fills += 1
+        if TRACE.bag:
+            TRACE.record("bag", "Bag filled and shuffled: %s", tuple(self.bag))
 
     def get_next(self):
         if not self.bag:
             self.fill_bag()
         shape_type = self.bag.pop(0)
-        logging.debug(f"Got tetromino {shape_type}, remaining in bag: {self.bag}")
+        if TRACE.bag:
+            TRACE.record("bag", "Got tetromino %s, remaining in bag: %s", shape_type, tuple(self.bag))
         return Tetromino(shape_type)
\ No newline at end of file
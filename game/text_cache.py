@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+class TextCache:
+    #LRU-bounded cache of rendered text surfaces keyed by (text, font, color)
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        #Get a rendered text surface, rasterizing it only on a cache miss
+        key = (text, font, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+class GlyphAtlas:
+    #Pre-rendered glyphs used to compose fast-changing numbers without font rasterization
+    def __init__(self, font, color, glyphs="0123456789-:.s"):
+        self.glyphs = {glyph: font.render(glyph, True, color) for glyph in glyphs}
+        self.font = font
+        self.color = color
+
+    def blits(self, text, position):
+        #(glyph surface, position) pairs for Surface.blits, unknown characters are rendered with the font
+        x, y = position
+        sequence = []
+        for glyph in text:
+            glyph_surface = self.glyphs.get(glyph)
+            if glyph_surface is None:
+                glyph_surface = self.font.render(glyph, True, self.color)
+                self.glyphs[glyph] = glyph_surface
+            sequence.append((glyph_surface, (x, y)))
+            x += glyph_surface.get_width()
+        return sequence
+
+    def draw(self, surface, text, position):
+        #Blit text glyph by glyph
+        sequence = self.blits(text, position)
+        surface.blits(sequence, doreturn=False)
+        x, y = position
+        width = sum(glyph_surface.get_width() for glyph_surface, _ in sequence)
+        height = max((glyph_surface.get_height() for glyph_surface, _ in sequence), default=0)
+        return surface.get_rect().clip((x, y, width, height))
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from config import GAME_MODES, SIMULATION_HZ, AUTOPLAY_MOVE_DELAY
+from .engine import Engine, FixedStepClock
+from .search import Autopilot, Heuristic, best_placement, enumerate_placements
+from .profiler import percentile
+
+#Headless batch runner: games run in worker processes on the fixed simulation clock, one
+#input every move_delay ms of game time like autoplay, so game times compare with human play.
+#Each finished game is appended to a JSONL results file as it arrives.
+#Jobs already in the results file are skipped, so an interrupted run resumes where it stopped.
+
+def heuristic_policy(weights=None):
+    heuristic = Heuristic(weights)
+    def choose(engine, rng):
+        return best_placement(engine.board, engine.current_tetromino, heuristic)
+    return choose
+
+def random_policy():
+    def choose(engine, rng):
+        tetromino = engine.current_tetromino
+        placements = enumerate_placements(engine.board, tetromino.shape_type, tetromino.rotation, tetromino.x, tetromino.y)
+        return rng.choice(placements) if placements else None
+    return choose
+
+POLICIES = {
+    "heuristic": heuristic_policy,
+    "random": random_policy
+}
+
+def policy_hash(job):
+    #Short stable hash of the policy arguments, so games with different weights never share an id
+    args = json.dumps(job.get("policy_args", ()), sort_keys=True)
+    return hashlib.sha1(args.encode("utf-8")).hexdigest()[:8]
+
+def job_id(job):
+    return f"{job['mode']}:{job['policy']}:{policy_hash(job)}:{job['seed']}:{job['move_delay']}ms"
+
+def play_game(game_mode, seed, choose, max_pieces=2000, move_delay=AUTOPLAY_MOVE_DELAY):
+    #Play one game with a placement policy driving the autoplay bot
+    clock = FixedStepClock(SIMULATION_HZ)
+    engine = Engine(clock=clock)
+    engine.start(game_mode, seed)
+    rng = random.Random(seed)
+    autopilot = Autopilot(move_delay=move_delay, choose=lambda engine: choose(engine, rng))
+    pieces = 0
+    piece = None
+    while not engine.over and pieces < max_pieces:
+        clock.step()
+        if engine.current_tetromino is not piece:
+            piece = engine.current_tetromino
+            pieces += 1
+        autopilot.step(engine)
+        engine.update()
+    return engine, pieces
+
+def run_job(job):
+    #Worker entry point, returns one JSON-ready result
+    started = time.perf_counter()
+    choose = POLICIES[job["policy"]](*job.get("policy_args", ()))
+    engine, pieces = play_game(job["mode"], job["seed"], choose, job["max_pieces"], job["move_delay"])
+    return {
+        "id": job_id(job),
+        "mode": job["mode"],
+        "policy": job["policy"],
+        "policy_hash": policy_hash(job),
+        "seed": job["seed"],
+        "move_delay": job["move_delay"],
+        "score": engine.score,
+        "level": engine.level,
+        "lines_cleared": engine.lines_cleared,
+        "pieces": pieces,
+        "capped": not engine.over,
+        "max_height": engine.board.max_height(),
+        "holes": engine.board.holes(),
+        "bumpiness": engine.board.bumpiness(),
+        "stats": {
+            "tetrominos": engine.stats["tetrominos"],
+            "lines": {str(lines): count for lines, count in engine.stats["lines"].items()},
+            "time": engine.stats["time"]
+        },
+        "elapsed": time.perf_counter() - started
+    }
+
+def make_jobs(modes, policies, seeds, max_pieces, move_delay, weights=None):
+    jobs = []
+    for mode in modes:
+        for policy in policies:
+            for seed in seeds:
+                job = {"mode": mode, "policy": policy, "seed": seed, "max_pieces": max_pieces, "move_delay": move_delay}
+                if policy == "heuristic" and weights:
+                    job["policy_args"] = (weights,)
+                jobs.append(job)
+    return jobs
+
+def load_results(path):
+    #Results already in the file, a torn last line from an interrupted run is ignored
+    results = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    pass
+    return results
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values),
+        "min": values[0],
+        "p10": percentile(values, 0.10),
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "max": values[-1]
+    }
+
+def summarize(results):
+    #Distributions per mode, policy with its arguments and move delay
+    groups = {}
+    for result in results:
+        name = f"{result['mode']}/{result['policy']}[{result['policy_hash']}]@{result['move_delay']}ms"
+        groups.setdefault(name, []).append(result)
+    summary = {}
+    for name, group in sorted(groups.items()):
+        tetrominos = {}
+        lines = {}
+        for result in group:
+            for shape_type, count in result["stats"]["tetrominos"].items():
+                tetrominos[shape_type] = tetrominos.get(shape_type, 0) + count
+            for cleared, count in result["stats"]["lines"].items():
+                lines[cleared] = lines.get(cleared, 0) + count
+        summary[name] = {
+            "games": len(group),
+            "capped": sum(result["capped"] for result in group),
+            "score": distribution([result["score"] for result in group]),
+            "level": distribution([result["level"] for result in group]),
+            "lines_cleared": distribution([result["lines_cleared"] for result in group]),
+            "pieces": distribution([result["pieces"] for result in group]),
+            "time": distribution([result["stats"]["time"] for result in group]),
+            "max_height": distribution([result["max_height"] for result in group]),
+            "holes": distribution([result["holes"] for result in group]),
+            "tetrominos": {shape_type: count / len(group) for shape_type, count in tetrominos.items()},
+            "lines": lines
+        }
+    return summary
+
+def run(jobs, results_path, processes=None, progress_every=1.0):
+    #Run the jobs not yet in results_path, appending each result as it finishes
+    done = {result["id"] for result in load_results(results_path)}
+    pending = [job for job in jobs if job_id(job) not in done]
+    total = len(pending)
+    print(f"{len(jobs) - total} of {len(jobs)} games already in {results_path}, running {total}", file=sys.stderr)
+    if not pending:
+        return
+    started = last_report = time.perf_counter()
+    processes = processes or os.cpu_count()
+    chunksize = max(1, min(16, total // (processes * 8)))
+    with open(results_path, "a") as f, multiprocessing.Pool(processes) as pool:
+        for count, result in enumerate(pool.imap_unordered(run_job, pending, chunksize), 1):
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            now = time.perf_counter()
+            if now - last_report >= progress_every or count == total:
+                rate = count / (now - started)
+                print(f"[{count}/{total}] {rate:.1f} games/s, eta {(total - count) / rate:.0f} s, "
+                      f"last {result['id']} score={result['score']}", file=sys.stderr)
+                last_report = now
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless games in parallel and summarize the results")
+    parser.add_argument("--modes", nargs="+", default=list(GAME_MODES), choices=list(GAME_MODES))
+    parser.add_argument("--policies", nargs="+", default=["heuristic"], choices=list(POLICIES))
+    parser.add_argument("--games", type=int, default=100, help="games per mode and policy")
+    parser.add_argument("--seed", type=int, default=0, help="first seed, games use consecutive seeds")
+    parser.add_argument("--weights", help="JSON file with Heuristic weight overrides")
+    parser.add_argument("--max-pieces", type=int, default=2000, help="stop a game after this many pieces")
+    parser.add_argument("--move-delay", type=int, default=AUTOPLAY_MOVE_DELAY, help="game time between policy inputs (ms)")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--results", default="tournament.jsonl", help="JSONL results file, appended to and resumed from")
+    parser.add_argument("--summary-only", action="store_true", help="only summarize the results file")
+    args = parser.parse_args()
+
+    if not args.summary_only:
+        weights = None
+        if args.weights:
+            with open(args.weights) as f:
+                weights = json.load(f)
+        seeds = range(args.seed, args.seed + args.games)
+        run(make_jobs(args.modes, args.policies, seeds, args.max_pieces, args.move_delay, weights), args.results, args.processes)
+    print(json.dumps(summarize(load_results(args.results)), indent=2))
+
+if __name__ == "__main__":
+    main()
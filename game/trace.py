@@ -0,0 +1,66 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+from collections import deque
+
+#Trace categories, each one is a boolean attribute on the tracer
+CATEGORIES = ("rotation", "kicks", "bag", "locks", "clears")
+
+class Tracer:
+    #Category-gated trace recorder. Call sites check the category flag first,
+    #so a disabled category costs one attribute lookup and no formatting or I/O
+    def __init__(self, capacity=4096):
+        self.records = deque(maxlen=capacity)
+        self.logger = logging.getLogger("tetris.trace")
+        for category in CATEGORIES:
+            setattr(self, category, False)
+
+    def enable(self, *categories):
+        #Enable categories, all of them if none are given
+        for category in categories or CATEGORIES:
+            if category not in CATEGORIES:
+                raise ValueError(f"Unknown trace category: {category}")
+            setattr(self, category, True)
+        self.logger.setLevel(logging.DEBUG)
+
+    def disable(self, *categories):
+        #Disable categories, all of them if none are given
+        for category in categories or CATEGORIES:
+            setattr(self, category, False)
+
+    def record(self, category, message, *args):
+        #Store a record in the ring buffer, formatting is left to readers and the log thread
+        self.records.append((time.monotonic(), category, message, args))
+        self.logger.debug(message, *args)
+
+    def dump(self):
+        #Formatted records currently held in the ring buffer
+        return [f"{timestamp:.6f} {category}: {message % args if args else message}"
+                for timestamp, category, message, args in self.records]
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    #Queue records unformatted so message formatting happens on the listener thread
+    def prepare(self, record):
+        return record
+
+TRACE = Tracer()
+
+_listener = None
+
+def configure_logging(filename="tetris.log", level=logging.ERROR, max_bytes=1_000_000, backup_count=3):
+    #Route logging through a queue to a rotating file written by a background thread
+    global _listener
+    if _listener is not None:
+        return _listener
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,248 @@
+import numpy as np
+from config import SCORE_DATA, LINES_PER_LEVEL, GRID_ROWS, GRID_COLS
+from .tetromino import ORIENTATIONS
+
+#Piece type indices used in observations
+PIECES = tuple(ORIENTATIONS)
+
+#Actions
+NOOP, LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, SOFT_DROP, HARD_DROP, HOLD = range(8)
+ACTIONS = ("noop", "left", "right", "rotate_cw", "rotate_ccw", "soft_drop", "hard_drop", "hold")
+
+#Wall columns on each side of a row and hidden rows above and below the board
+PAD = 4
+
+def _piece_tables():
+    #Row masks (type, rotation, dy) and kick offsets (type, rotation, kick, dx/dy) as arrays
+    masks = np.zeros((len(PIECES), 4, 4), dtype=np.int64)
+    kicks_cw = np.zeros((len(PIECES), 4, 7, 2), dtype=np.int64)
+    kicks_ccw = np.zeros((len(PIECES), 4, 7, 2), dtype=np.int64)
+    for piece, shape_type in enumerate(PIECES):
+        for rotation, orientation in enumerate(ORIENTATIONS[shape_type]):
+            for x, y in orientation.cells:
+                masks[piece, rotation, y] |= 1 << x
+            kicks_cw[piece, rotation] = orientation.kicks_cw
+            kicks_ccw[piece, rotation] = orientation.kicks_ccw
+    return masks, kicks_cw, kicks_ccw
+
+MASKS, KICKS_CW, KICKS_CCW = _piece_tables()
+
+class VectorEnv:
+    #N boards stepped in lockstep with the same rules as Board, Tetromino and Engine.
+    #Each board row is an integer bitmask with wall bits on both sides, hidden rows
+    #above the board are empty and rows below it are solid, so collision, landing and
+    #line clears are array operations over all boards at once.
+    #One step applies one action per board, then gravity every gravity_interval steps.
+    def __init__(self, num_envs, rows=GRID_ROWS, cols=GRID_COLS, gravity_interval=1, seed=None, autoreset=True):
+        if cols + 2 * PAD > 62:
+            raise ValueError("VectorEnv supports at most 54 columns")
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.spawn_x = (cols - 4) // 2
+        self.gravity_interval = gravity_interval
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng(seed)
+
+        self.empty_row = ((1 << PAD) - 1) | (((1 << PAD) - 1) << (PAD + cols))
+        self.full_row = (1 << (cols + 2 * PAD)) - 1
+
+        self.board = np.empty((num_envs, rows + 2 * PAD), dtype=np.int64)
+        self.piece = np.zeros(num_envs, dtype=np.int64)
+        self.rotation = np.zeros(num_envs, dtype=np.int64)
+        self.x = np.zeros(num_envs, dtype=np.int64)
+        self.y = np.zeros(num_envs, dtype=np.int64)
+        self.hold = np.full(num_envs, -1, dtype=np.int64)
+        self.can_hold = np.ones(num_envs, dtype=bool)
+        self.queue = np.zeros((num_envs, 14), dtype=np.int64)
+        self.queue_pos = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.lines = np.zeros(num_envs, dtype=np.int64)
+        self.level = np.ones(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.all_envs = np.ones(num_envs, dtype=bool)
+
+    def reset(self, mask=None):
+        #Reset all boards, or only those selected by a boolean mask, and return observations
+        mask = self.all_envs if mask is None else mask
+        count = int(mask.sum())
+        self.board[mask] = self.empty_row
+        self.board[mask, self.rows + PAD:] = self.full_row
+        self.hold[mask] = -1
+        self.can_hold[mask] = True
+        self.queue[mask] = np.concatenate([self._new_bags(count), self._new_bags(count)], axis=1)
+        self.queue_pos[mask] = 0
+        self.score[mask] = 0
+        self.lines[mask] = 0
+        self.level[mask] = 1
+        self.steps[mask] = 0
+        self._spawn(mask)
+        return self.observe()
+
+    def step(self, actions):
+        #Apply one action per board, returns (observations, rewards, dones, info)
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.num_envs, dtype=np.int64)
+        lock = np.zeros(self.num_envs, dtype=bool)
+
+        self._shift(actions == LEFT, -1)
+        self._shift(actions == RIGHT, 1)
+        self._rotate(actions == ROTATE_CW, KICKS_CW, 1)
+        self._rotate(actions == ROTATE_CCW, KICKS_CCW, -1)
+        self._hold(actions == HOLD)
+
+        soft = np.nonzero(actions == SOFT_DROP)[0]
+        moved = soft[~self._collides(soft, self.piece[soft], self.rotation[soft], self.x[soft], self.y[soft] + 1)]
+        self.y[moved] += 1
+        rewards[moved] += self.level[moved]
+
+        hard = actions == HARD_DROP
+        index = np.nonzero(hard)[0]
+        distance = self._drop_distance(index)
+        self.y[index] += distance
+        rewards[index] += 2 * distance * self.level[index]
+        lock |= hard
+
+        self.steps += 1
+        gravity = np.nonzero(~hard & (self.steps % self.gravity_interval == 0))[0]
+        blocked = self._collides(gravity, self.piece[gravity], self.rotation[gravity], self.x[gravity], self.y[gravity] + 1)
+        self.y[gravity[~blocked]] += 1
+        lock[gravity[blocked]] = True
+
+        cleared = np.zeros(self.num_envs, dtype=np.int64)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        if lock.any():
+            cleared, dones = self._lock(lock)
+            rewards += self._score(cleared)
+        self.score += rewards
+
+        info = {"lines_cleared": cleared, "score": self.score.copy()}
+        if self.autoreset and dones.any():
+            info["final_score"] = np.where(dones, self.score, 0)
+            self.reset(dones)
+        return self.observe(), rewards, dones, info
+
+    def observe(self):
+        #Board occupancy (N, rows, cols) plus active piece, next piece and hold arrays
+        core = (self.board[:, PAD:PAD + self.rows] >> PAD).astype("<u8")
+        bits = np.unpackbits(core.view(np.uint8).reshape(self.num_envs, self.rows, 8), axis=2, bitorder="little")
+        occupancy = bits[:, :, :self.cols].view(bool)
+        return {
+            "board": occupancy,
+            "piece": np.stack([self.piece, self.rotation, self.x, self.y], axis=1),
+            "next": self.queue[np.arange(self.num_envs), self.queue_pos],
+            "hold": self.hold.copy()
+        }
+
+    def _new_bags(self, count):
+        #One shuffled 7-bag per board
+        return np.argsort(self.rng.random((count, len(PIECES))), axis=1)
+
+    def _spawn(self, mask):
+        #Take the next piece from each selected board's bag
+        index = np.nonzero(mask)[0]
+        self.piece[index] = self.queue[index, self.queue_pos[index]]
+        self.queue_pos[index] += 1
+        refill = index[self.queue_pos[index] >= len(PIECES)]
+        if refill.size:
+            self.queue[refill, :len(PIECES)] = self.queue[refill, len(PIECES):]
+            self.queue[refill, len(PIECES):] = self._new_bags(refill.size)
+            self.queue_pos[refill] -= len(PIECES)
+        self.rotation[index] = 0
+        self.x[index] = self.spawn_x
+        self.y[index] = 0
+        self.can_hold[index] = True
+
+    def _collides(self, index, piece, rotation, x, y):
+        #Collision test for the boards in index, other arguments are aligned with it
+        masks = MASKS[piece, rotation] << (x + PAD)[:, None]
+        rows = np.minimum(y[:, None] + (PAD + np.arange(4)), self.rows + 2 * PAD - 1)
+        return (self.board[index[:, None], rows] & masks).any(axis=1)
+
+    def _shift(self, mask, direction):
+        index = np.nonzero(mask)[0]
+        new_x = self.x[index] + direction
+        ok = index[~self._collides(index, self.piece[index], self.rotation[index], new_x, self.y[index])]
+        self.x[ok] += direction
+
+    def _rotate(self, mask, kicks, direction):
+        #Try each kick offset in order, boards keep the first one that fits
+        pending = np.nonzero(mask)[0]
+        for kick in range(kicks.shape[2]):
+            if not pending.size:
+                break
+            piece, rotation = self.piece[pending], self.rotation[pending]
+            target = (rotation + direction) % 4
+            offsets = kicks[piece, rotation, kick]
+            new_x = self.x[pending] + offsets[:, 0]
+            new_y = self.y[pending] + offsets[:, 1]
+            fits = ~self._collides(pending, piece, target, new_x, new_y)
+            ok = pending[fits]
+            self.x[ok] = new_x[fits]
+            self.y[ok] = new_y[fits]
+            self.rotation[ok] = target[fits]
+            pending = pending[~fits]
+
+    def _hold(self, mask):
+        mask = mask & self.can_hold
+        if not mask.any():
+            return
+        empty = mask & (self.hold < 0)
+        swap = mask & ~empty
+        self.hold[swap], self.piece[swap] = self.piece[swap], self.hold[swap]
+        self.rotation[swap] = 0
+        self.x[swap] = self.spawn_x
+        self.y[swap] = 0
+        self.hold[empty] = self.piece[empty]
+        self._spawn(empty)
+        self.can_hold[mask] = False
+
+    def _drop_distance(self, index):
+        #Rows each piece in index can fall, every candidate depth is tested at once
+        if not index.size:
+            return np.zeros(0, dtype=np.int64)
+        masks = MASKS[self.piece[index], self.rotation[index]] << (self.x[index] + PAD)[:, None]
+        depths = np.arange(1, self.rows + 2)
+        rows = np.minimum(self.y[index, None, None] + depths[None, :, None] + (PAD + np.arange(4)),
+                          self.rows + 2 * PAD - 1)
+        hits = (self.board[index[:, None, None], rows] & masks[:, None, :]).any(axis=2)
+        return hits.argmax(axis=1)
+
+    def _lock(self, mask):
+        #Write pieces into their boards, clear full rows and spawn next pieces
+        #A piece locking above the top of the board ends the game and is not written
+        masks = MASKS[self.piece, self.rotation] << (self.x + PAD)[:, None]
+        above = ((masks != 0) & (self.y[:, None] + np.arange(4) < 0)).any(axis=1)
+        dones = mask & above
+        index = np.nonzero(mask & ~above)[0]
+        for dy in range(4):
+            self.board[index, self.y[index] + PAD + dy] |= masks[index, dy]
+
+        core = self.board[index, PAD:PAD + self.rows]
+        full = core == self.full_row
+        cleared = np.zeros(self.num_envs, dtype=np.int64)
+        cleared[index] = full.sum(axis=1)
+        clearing = cleared[index] > 0
+        if clearing.any():
+            #Stable sort moves full rows to the top, then they are emptied
+            rows = core[clearing]
+            order = np.argsort(~full[clearing], axis=1, kind="stable")
+            rows = np.take_along_axis(rows, order, axis=1)
+            rows[np.arange(self.rows) < cleared[index][clearing][:, None]] = self.empty_row
+            self.board[index[clearing], PAD:PAD + self.rows] = rows
+
+        self._spawn(mask)
+        spawned = np.nonzero(mask)[0]
+        dones[spawned] |= self._collides(spawned, self.piece[spawned], self.rotation[spawned], self.x[spawned], self.y[spawned])
+        return cleared, dones
+
+    def _score(self, cleared):
+        #Line clear score with the level before the clear, then level up
+        table = np.zeros(5, dtype=np.int64)
+        for lines, points in SCORE_DATA.items():
+            if lines <= 4:
+                table[lines] = points
+        rewards = table[np.minimum(cleared, 4)] * self.level
+        self.lines += cleared
+        self.level = np.maximum(self.level, 1 + self.lines // LINES_PER_LEVEL)
+        return rewards
@@ -0,0 +1,256 @@
+import logging
+import random
+import time
+from collections import deque
+from config import (GRID_ROWS, GRID_COLS, VIEWPORT_ROWS, VIEWPORT_COLS, SIMULATION_HZ, DAS, ARR, SOFT_DROP_ARR,
+                    AUTOPLAY_MOVE_DELAY, AUTOPLAY_WEIGHTS, PROFILER_WINDOW, VERSUS_KEY_BINDINGS, GARBAGE_LINES)
+from .engine import Engine, FixedStepClock
+from .grid import Grid
+from .input import InputMap, AutoShift, REPEATING, apply_inputs
+from .search import Autopilot, Heuristic
+from .profiler import percentile
+from .text_cache import GlyphAtlas
+
+#Pixels around each board and the height of the label lines above and below it
+MARGIN = 10
+LABEL_HEIGHT = 22
+METER_COLOR = (220, 40, 40)
+
+def versus_layout(count, rows, cols, width, height, scale=1):
+    #Cell size and top left corner of each board for count boards, at most four to a row.
+    #Every board gets one extra column on its left for the incoming garbage meter.
+    #scale grows the margins and labels along with the fonts
+    margin, label_height = round(MARGIN * scale), round(LABEL_HEIGHT * scale)
+    columns = min(count, 4)
+    lines = -(-count // columns)
+    slot_width = width // columns
+    slot_height = height // lines
+    cell_size = min((slot_width - 2 * margin) // (cols + 1), (slot_height - 2 * margin - 2 * label_height) // rows)
+    origins = []
+    for index in range(count):
+        column, line = index % columns, index // columns
+        board_width = (cols + 1) * cell_size
+        origins.append((column * slot_width + (slot_width - board_width) // 2 + cell_size,
+                        line * slot_height + margin + label_height))
+    return cell_size, origins
+
+class Player:
+    #One board of a versus match with its own grid, bag and keys, played by autoplay without keys
+    def __init__(self, index, grid, clock, origin, key_bindings=None):
+        self.index = index
+        self.name = f"P{index + 1}"
+        self.grid = grid
+        self.engine = Engine(grid, clock)
+        self.origin = origin
+        self.input_map = InputMap(key_bindings) if key_bindings else None
+        self.auto_shift = AutoShift(DAS, ARR, SOFT_DROP_ARR)
+        self.pending_inputs = deque()
+        self.autopilot = None if key_bindings else Autopilot(Heuristic(AUTOPLAY_WEIGHTS), AUTOPLAY_MOVE_DELAY)
+        #Simulation and draw time of this board in the current frame, ms, and a rolling window of their sum
+        self.sim_ms = 0.0
+        self.draw_ms = 0.0
+        self.costs = deque(maxlen=PROFILER_WINDOW)
+        self.reset()
+
+    def reset(self):
+        self.pending_inputs.clear()
+        self.auto_shift.release_all()
+        if self.autopilot:
+            self.autopilot.reset()
+        self.target = self.index
+        self.sent = 0
+
+    def step(self):
+        #One simulation tick of this board
+        engine = self.engine
+        started = time.perf_counter()
+        apply_inputs(engine, self.pending_inputs, self.auto_shift)
+        if self.autopilot and not engine.over:
+            self.autopilot.step(engine)
+        engine.update()
+        self.sim_ms += (time.perf_counter() - started) * 1000
+
+class Versus:
+    #Local match of 2 to 8 boards stepped together on one simulation clock and drawn with a single
+    #Surface.blits call. Cleared lines are sent as garbage to the next opponent still alive, after
+    #cancelling garbage queued against the sender. The last board standing wins
+    def __init__(self, count, sprites, theme_name, screen_size, key_bindings=VERSUS_KEY_BINDINGS, scale=1):
+        if not 2 <= count <= 8:
+            raise ValueError("A versus match needs 2 to 8 players")
+        rows, cols = min(GRID_ROWS, VIEWPORT_ROWS), min(GRID_COLS, VIEWPORT_COLS)
+        cell_size, origins = versus_layout(count, rows, cols, *screen_size, scale)
+        self.cell_size = cell_size
+        self.scale = scale
+        self.label_height = round(LABEL_HEIGHT * scale)
+        self.clock = FixedStepClock(SIMULATION_HZ)
+        self.players = []
+        #Key code to (player, action) over every player's bindings
+        self.keys = {}
+        for index in range(count):
+            grid = Grid(sprites, cell_size=cell_size)
+            grid.current_theme = theme_name
+            grid.update_theme()
+            bindings = key_bindings[index] if index < len(key_bindings) else None
+            player = Player(index, grid, self.clock, origins[index], bindings)
+            player.engine.subscribe(lambda event, *args, player=player: self.on_event(player, event, *args))
+            if player.input_map:
+                for keycode, action in player.input_map.actions.items():
+                    self.keys[keycode] = (player, action)
+            self.players.append(player)
+        self.sprites = sprites
+        self.glyph_atlases = {}
+        self.cost_labels = {}
+        self.frames = 0
+        self.over = False
+        self.winner = None
+
+    def start(self, seed=None):
+        #Start a match, every board gets the same tetromino sequence
+        seed = seed if seed is not None else random.randrange(1 << 32)
+        self.clock.ticks = 0
+        self.over = False
+        self.winner = None
+        for player in self.players:
+            player.reset()
+            player.engine.start("Marathon", seed)
+
+    def resize(self, screen_size, scale=1):
+        #Lay the boards out again for a new screen size, the match carries on
+        grid = self.players[0].grid
+        cell_size, origins = versus_layout(len(self.players), grid.view_rows, grid.view_cols, *screen_size, scale)
+        self.cell_size = cell_size
+        self.scale = scale
+        self.label_height = round(LABEL_HEIGHT * scale)
+        for player, origin in zip(self.players, origins):
+            player.origin = origin
+            player.grid.set_cell_size(cell_size)
+        self.glyph_atlases.clear()
+
+    def subscribe(self, listener):
+        #Register listener(event, *args) on every board's engine
+        for player in self.players:
+            player.engine.subscribe(listener)
+
+    def key_down(self, key):
+        #Queue a key press for the player it belongs to, False if no player uses the key
+        entry = self.keys.get(key)
+        if entry is None:
+            return False
+        player, action = entry
+        player.pending_inputs.append((True, action))
+        return True
+
+    def key_up(self, key):
+        entry = self.keys.get(key)
+        if entry is not None and entry[1] in REPEATING:
+            entry[0].pending_inputs.append((False, entry[1]))
+
+    def release_all(self):
+        for player in self.players:
+            player.auto_shift.release_all()
+
+    def step(self):
+        #One simulation tick for every board still playing
+        self.clock.step()
+        for player in self.players:
+            if not player.engine.over:
+                player.step()
+
+    def on_event(self, player, event, *args):
+        #Route attacks and detect the end of the match
+        if event == "clear":
+            attack = player.engine.cancel_garbage(GARBAGE_LINES.get(args[0], 0))
+            target = self.next_target(player) if attack else None
+            if target is not None:
+                target.engine.receive_garbage(attack)
+                player.sent += attack
+        elif event == "game_over":
+            alive = [other for other in self.players if not other.engine.over]
+            if len(alive) <= 1 and not self.over:
+                self.over = True
+                self.winner = alive[0] if alive else None
+                self.report()
+
+    def next_target(self, player):
+        #Opponents still alive take turns receiving a player's attacks
+        count = len(self.players)
+        for offset in range(1, count):
+            candidate = self.players[(player.target + offset) % count]
+            if candidate is not player and not candidate.engine.over:
+                player.target = candidate.index
+                return candidate
+        return None
+
+    def draw(self, screen, theme, text_cache, font, show_costs=False):
+        #Collect every board's stack layer, pieces, garbage meter and labels, then blit them in one call
+        sequence = []
+        color = theme["text"]
+        atlas = self.glyph_atlases.get((font, tuple(color)))
+        if atlas is None:
+            atlas = self.glyph_atlases[(font, tuple(color))] = GlyphAtlas(font, color)
+        if show_costs and (not self.cost_labels or self.frames % 15 == 0):
+            self.cost_labels = {player.index: self.cost_label(player) for player in self.players}
+        for player in self.players:
+            started = time.perf_counter()
+            sequence += self.board_blits(player, theme, text_cache, font, atlas, show_costs)
+            player.draw_ms += (time.perf_counter() - started) * 1000
+        screen.blits(sequence, doreturn=False)
+        self.end_frame()
+
+    def board_blits(self, player, theme, text_cache, font, atlas, show_costs):
+        grid, engine = player.grid, player.engine
+        left, top = player.origin
+        cell_size = self.cell_size
+        tetromino = engine.current_tetromino
+        if tetromino and not engine.over:
+            ghost_y = tetromino.y + grid.drop_distance(tetromino)
+            grid.follow(tetromino, ghost_y)
+        sequence = [(grid.stack_surface, player.origin)]
+        if tetromino and not engine.over:
+            cells = tetromino.orientation.cells
+            sequence += grid.cell_blits(cells, tetromino.x, ghost_y, tetromino.color, theme["ghost_alpha"], player.origin)
+            sequence += grid.cell_blits(cells, tetromino.x, tetromino.y, tetromino.color, theme["cell_alpha"], player.origin)
+        meter = self.sprites.get(METER_COLOR, 255, cell_size - 1, 2)
+        for row in range(min(engine.pending_garbage, grid.view_rows)):
+            sequence.append((meter, (left - cell_size, top + (grid.view_rows - 1 - row) * cell_size)))
+        label = text_cache.render(font, player.name, theme["text"])
+        label_top = top - self.label_height
+        sequence.append((label, (left, label_top)))
+        sequence += atlas.blits(str(engine.score), (left + label.get_width() + round(8 * self.scale), label_top))
+        if show_costs:
+            cost = text_cache.render(font, self.cost_labels.get(player.index, ""), theme["text"])
+            sequence.append((cost, (left, top + grid.view_rows * cell_size + 2)))
+        status = "WINNER" if player is self.winner else "KO" if engine.over else None
+        if status:
+            text = text_cache.render(font, status, theme["text"])
+            sequence.append((text, text.get_rect(center=(left + grid.view_cols * cell_size // 2, top + grid.view_rows * cell_size // 2))))
+        return sequence
+
+    def end_frame(self):
+        #Record each board's simulation plus draw time for this frame
+        for player in self.players:
+            player.costs.append(player.sim_ms + player.draw_ms)
+            player.sim_ms = player.draw_ms = 0.0
+        self.frames += 1
+
+    def cost_label(self, player):
+        costs = sorted(player.costs)
+        return f"{percentile(costs, 0.5):.2f}/{percentile(costs, 0.99):.2f}ms" if costs else ""
+
+    def cost_lines(self):
+        #Per board frame cost percentiles, simulation plus draw preparation
+        lines = []
+        for player in self.players:
+            costs = sorted(player.costs)
+            if costs:
+                lines.append(f"{player.name}: p50 {percentile(costs, 0.5):.3f} ms, p99 {percentile(costs, 0.99):.3f} ms, "
+                             f"max {costs[-1]:.3f} ms over {len(costs)} frames")
+        return lines
+
+    def report(self):
+        #Log the result and per board frame costs at the end of a match
+        logger = logging.getLogger("tetris.versus")
+        logger.info("Versus over, winner %s, garbage sent %s", self.winner.name if self.winner else "none",
+                    ", ".join(f"{player.name} {player.sent}" for player in self.players))
+        for line in self.cost_lines():
+            logger.info("Frame cost %s", line)